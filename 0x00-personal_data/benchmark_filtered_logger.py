@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Micro-benchmark of the redaction of filtered_logger over a synthetic
+log corpus, against the per-field loop it replaced
+
+Usage:
+    python3 benchmark_filtered_logger.py [records]
+"""
+import logging
+import random
+import re
+import sys
+import time
+from typing import List
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+def loop_filter_datum(fields: List[str], redaction: str,
+                      message: str, separator: str) -> str:
+    """ Previous filter_datum: one re.sub per field """
+    for field in fields:
+        message = re.sub(f'{field}=.*?{separator}',
+                         f'{field}={redaction}{separator}', message)
+    return message
+
+
+def corpus(count: int) -> List[str]:
+    """ Returns records of 8 fields, PII and others, in random order """
+    fields = list(PII_FIELDS) + ["ip", "last_login", "user_agent"]
+    rand = random.Random(0)
+    records = []
+    for i in range(count):
+        rand.shuffle(fields)
+        records.append("".join("{}={}{};".format(
+            field, field[:3], rand.randrange(10 ** 9))
+            for field in fields))
+    return records
+
+
+def bench(name, function, records):
+    """ Prints the records per second of a function """
+    start = time.perf_counter()
+    for record in records:
+        function(record)
+    elapsed = time.perf_counter() - start
+    print("{}: {:.0f} records/s".format(name, len(records) / elapsed))
+
+
+records = corpus(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+fields = list(PII_FIELDS)
+
+for record in records[:1000]:
+    if filter_datum(fields, "***", record, ";") != \
+            loop_filter_datum(fields, "***", record, ";"):
+        raise SystemExit("outputs differ: {}".format(record))
+
+bench("loop filter_datum",
+      lambda record: loop_filter_datum(fields, "***", record, ";"),
+      records)
+bench("filter_datum",
+      lambda record: filter_datum(fields, "***", record, ";"), records)
+
+formatter = RedactingFormatter(fields)
+log_records = [logging.LogRecord("user_data", logging.INFO, None, None,
+                                 record, None, None) for record in records]
+bench("RedactingFormatter.format", formatter.format, log_records)
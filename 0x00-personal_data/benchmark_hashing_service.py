@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+""" Benchmark of the bcrypt throughput of HashingService by number of
+workers, threads and processes, against hashing on the calling thread
+
+Usage:
+    python3 benchmark_hashing_service.py [passwords] [rounds] [workers ...]
+"""
+import sys
+import time
+from encrypt_password import HashingService, hash_password, is_valid
+
+
+def bench(name, function, count):
+    """ Prints the hashes per second of a function doing count hashes """
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print("{}: {:.1f} hashes/s".format(name, count / elapsed))
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 2, 4, 8]
+passwords = ["password{}".format(i) for i in range(count)]
+hashed = hash_password(passwords[0], rounds)
+
+print("{} passwords, cost factor {}".format(count, rounds))
+bench("calling thread",
+      lambda: [hash_password(password, rounds) for password in passwords],
+      count)
+for processes in (False, True):
+    kind = "processes" if processes else "threads"
+    for workers in worker_counts:
+        with HashingService(workers, rounds, processes) as service:
+            # the pool starts its workers on the first tasks
+            service.verify_async(hashed, passwords[0]).result()
+            bench("hash_many, {} {}".format(workers, kind),
+                  lambda: list(service.hash_many(passwords)), count)
+            bench("verify_async, {} {}".format(workers, kind),
+                  lambda: [future.result() for future in [
+                      service.verify_async(hashed, password)
+                      for password in passwords]], count)
+
+if not is_valid(hashed, passwords[0]):
+    raise SystemExit("verification failed")
@@ -3,26 +3,35 @@
 Encrypting passwords
 """
 import bcrypt
+from collections import deque
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from os import cpu_count, environ
+from typing import Iterable, Iterator
 
 
-def hash_password(password: str) -> bytes:
-    """ 
+BCRYPT_ROUNDS = int(environ.get("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> bytes:
+    """
     Hashes the provided password using bcrypt with a salt.
 
     Args:
         password: A string representing the password to be hashed.
+        rounds: The bcrypt cost factor (log2 of the iterations).
 
     Returns:
         bytes: A salted, hashed password as a byte string.
     """
     encoded = password.encode()
-    hashed = bcrypt.hashpw(encoded, bcrypt.gensalt())
+    hashed = bcrypt.hashpw(encoded, bcrypt.gensalt(rounds))
 
     return hashed
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
-    """ 
+    """
     Validates whether the provided password matches the hashed password.
 
     Args:
@@ -37,3 +46,56 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     if bcrypt.checkpw(encoded, hashed_password):
         valid = True
     return valid
+
+
+class HashingService:
+    """
+    Runs bcrypt off the calling thread on a bounded pool of workers.
+
+    bcrypt releases the GIL while hashing, so threads already use
+    several cores; processes=True isolates the work in processes.
+    """
+
+    def __init__(self, workers: int = None, rounds: int = BCRYPT_ROUNDS,
+                 processes: bool = False):
+        """
+        Args:
+            workers: Number of workers, defaults to the number of CPUs.
+            rounds: The bcrypt cost factor of new hashes.
+            processes: Use a process pool instead of a thread pool.
+        """
+        self.workers = workers or cpu_count() or 1
+        self.rounds = rounds
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._executor: Executor = pool(max_workers=self.workers)
+
+    def hash_async(self, password: str) -> Future:
+        """ Returns a Future of hash_password(password) """
+        return self._executor.submit(hash_password, password, self.rounds)
+
+    def verify_async(self, hashed_password: bytes, password: str) -> Future:
+        """ Returns a Future of is_valid(hashed_password, password) """
+        return self._executor.submit(is_valid, hashed_password, password)
+
+    def hash_many(self, passwords: Iterable[str]) -> Iterator[bytes]:
+        """
+        Hashes a (possibly huge) stream of passwords, yielding the hashes
+        in input order with at most 2 * workers hashes in flight.
+        """
+        pending = deque()
+        for password in passwords:
+            pending.append(self.hash_async(password))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        """ Waits for the queued work and stops the workers """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
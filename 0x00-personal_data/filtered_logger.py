@@ -3,10 +3,17 @@
 Module for handling Personal Data
 """
 import re
+import sys
+import time
 import logging
+import logging.handlers
+from contextlib import contextmanager
+from functools import lru_cache
 from os import environ
+from queue import Empty, Queue
+from threading import Condition, Lock
 import mysql.connector
-from typing import List
+from typing import Any, Callable, List, Pattern, Tuple
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
@@ -15,10 +22,17 @@ PII_FIELDS = ("name", "email", "phone", "ssn", "password")
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """ Returns a log message obfuscated """
-    for field in fields:
-        message = re.sub(f'{field}=.*?{separator}',
-                         f'{field}={redaction}{separator}', message)
-    return message
+    if not fields:
+        return message
+    tail = f'={redaction}{separator}'
+    return datum_pattern(tuple(fields), separator).sub(
+        lambda match: match.group(1) + tail, message)
+
+
+@lru_cache(maxsize=32)
+def datum_pattern(fields: Tuple[str, ...], separator: str) -> Pattern:
+    """ Returns one compiled pattern matching any of the fields """
+    return re.compile(f'({"|".join(fields)})=.*?{separator}')
 
 
 def get_logger() -> logging.Logger:
@@ -48,24 +62,239 @@ def get_database_connection() -> mysql.connector.connection.MySQLConnection:
     return connection
 
 
+class ConnectionPool:
+    """ Bounded pool of reusable database connections """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 5,
+                 timeout: float = None):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._created = 0
+        # guards _idle and _created; notified when a connection is
+        # released or a slot is freed
+        self._cond = Condition()
+
+    def acquire(self):
+        """ Checks out a healthy connection, opening one if the pool
+        is not full, otherwise waiting for one to be released or
+        discarded; raises queue.Empty after timeout seconds """
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._created >= self.size:
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise Empty
+                    self._cond.wait(left)
+                if self._idle:
+                    connection = self._idle.pop()
+                else:
+                    self._created += 1
+                    connection = None
+
+            if connection is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    self._free_slot()
+                    raise
+
+            if self.is_healthy(connection):
+                return connection
+            self.discard(connection)
+
+    def release(self, connection):
+        """ Returns a connection to the pool """
+        try:
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+        with self._cond:
+            self._idle.append(connection)
+            self._cond.notify()
+
+    def discard(self, connection):
+        """ Closes a connection and frees its slot in the pool """
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._free_slot()
+
+    def close(self):
+        """ Closes every idle connection """
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self.discard(connection)
+
+    def _free_slot(self):
+        """ Frees the slot of a connection and wakes a waiter, which
+        opens a new one """
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """ Context manager checking a connection out and back in """
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    @staticmethod
+    def is_healthy(connection) -> bool:
+        """ Pings a connection before handing it out """
+        try:
+            if hasattr(connection, "is_connected"):
+                return connection.is_connected()
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """ Returns the process-wide pool of database connections """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = int(environ.get("PERSONAL_DATA_DB_POOL_SIZE", "5"))
+            _pool = ConnectionPool(lambda: get_database_connection(), size)
+    return _pool
+
+
+def get_pooled_connection():
+    """ Context manager lending a connection from the pool """
+    return get_connection_pool().connection()
+
+
 def main():
     """
     Obtain a database connection using get_database_connection
     and retrieves all rows in the users table and display each row under a filtered format
     """
-    database_connection = get_database_connection()
-    cursor = database_connection.cursor()
-    cursor.execute("SELECT * FROM users;")
-    field_names = [i[0] for i in cursor.description]
+    batch_size = int(environ.get("PERSONAL_DATA_BATCH_SIZE", "1000"))
+    output = environ.get("PERSONAL_DATA_EXPORT_FILE")
+
+    export_users(batch_size, output)
+
+
+def export_users(batch_size: int = 1000, output: str = None) -> int:
+    """
+    Streams the users table in fetchmany batches, redacts each batch
+    and hands it as one record to a queue-backed buffered writer
+    (stderr, or the output file when given).
+    Returns the number of exported rows.
+    """
+    pattern = datum_pattern(PII_FIELDS, RedactingFormatter.SEPARATOR)
+    tail = f'={RedactingFormatter.REDACTION}{RedactingFormatter.SEPARATOR}'
+
+    def redact(match):
+        return match.group(1) + tail
+
+    count = 0
+    with get_pooled_connection() as database_connection:
+        cursor = database_connection.cursor(buffered=False)
+        cursor.execute("SELECT * FROM users;")
+        field_names = [i[0] for i in cursor.description]
+
+        logger, listener = get_export_logger(output)
+        listener.start()
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                lines = [pattern.sub(redact, ' '.join(
+                    f'{field}={r};' for r, field in zip(row, field_names)))
+                    for row in rows]
+                logger.info('', extra={'lines': lines})
+                count += len(rows)
+        finally:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+            cursor.close()
+
+    return count
+
+
+def get_export_logger(output: str = None):
+    """
+    Returns a Logger writing batches of lines through a bounded queue,
+    and the QueueListener draining it into a buffered handler
+    """
+    logger = logging.Logger("user_data", logging.INFO)
+
+    if output is None:
+        stream = sys.stderr
+    else:
+        stream = open(output, 'a', buffering=1 << 20)
+
+    buffered_handler = BufferedStreamHandler(stream)
+    buffered_handler.setFormatter(BatchFormatter(RedactingFormatter.FORMAT))
+
+    queue = Queue(maxsize=16)
+    logger.addHandler(BlockingQueueHandler(queue))
+
+    return logger, logging.handlers.QueueListener(queue, buffered_handler)
+
+
+class BatchFormatter(logging.Formatter):
+    """ Formatter writing each line of a batch record under its header """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Prefixes every line of record.lines like a single record """
+        header = super(BatchFormatter, self).format(record)
+        return '\n'.join(header + line for line in record.lines)
+
+
+class BlockingQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler waiting for room in a bounded queue """
+
+    def enqueue(self, record: logging.LogRecord):
+        """ Blocks until the record fits in the queue """
+        self.queue.put(record)
+
 
-    logger = get_logger()
+class BufferedStreamHandler(logging.StreamHandler):
+    """ StreamHandler leaving flushes to the stream buffer and close() """
 
-    for row in cursor:
-        str_row = ''.join(f'{field}={str(r)}; ' for r, field in zip(row, field_names))
-        logger.info(str_row.strip())
+    def emit(self, record: logging.LogRecord):
+        """ Writes a formatted record without flushing """
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
 
-    cursor.close()
-    database_connection.close()
+    def close(self):
+        """ Flushes, then closes the stream unless it is stderr """
+        self.acquire()
+        try:
+            self.flush()
+            if self.stream not in (sys.stdout, sys.stderr):
+                self.stream.close()
+        finally:
+            self.release()
+        super(BufferedStreamHandler, self).close()
 
 
 class RedactingFormatter(logging.Formatter):
@@ -78,11 +307,17 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.pattern = None
+        if fields:
+            self.pattern = datum_pattern(tuple(fields), self.SEPARATOR)
+        tail = f'={self.REDACTION}{self.SEPARATOR}'
+        self.replacement = lambda match: match.group(1) + tail
 
     def format(self, record: logging.LogRecord) -> str:
-        """ Filters values in incoming log records using filter_datum """
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        """ Filters values in incoming log records in a single pass """
+        record.msg = record.getMessage()
+        if self.pattern is not None:
+            record.msg = self.pattern.sub(self.replacement, record.msg)
         return super(RedactingFormatter, self).format(record)
 
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+""" Tests of ConnectionPool, over SQLite connections
+
+Usage:
+    python3 -m unittest test_connection_pool
+"""
+import sqlite3
+import threading
+import time
+import unittest
+from queue import Empty
+from filtered_logger import ConnectionPool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """ ConnectionPool with sqlite3.connect as the connector """
+
+    def setUp(self):
+        """ Counts the connections opened by the pool """
+        self.opened = []
+
+        def connect():
+            connection = sqlite3.connect(":memory:",
+                                         check_same_thread=False)
+            self.opened.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(connect, size=2, timeout=0.2)
+
+    def tearDown(self):
+        """ Closes the idle connections """
+        self.pool.close()
+
+    def test_reuse(self):
+        """ Released connections are handed out again """
+        for _ in range(10):
+            with self.pool.connection() as connection:
+                connection.execute("SELECT 1")
+        self.assertEqual(len(self.opened), 1)
+
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.pool.release(first)
+        self.pool.release(second)
+        for _ in range(10):
+            with self.pool.connection() as connection:
+                connection.execute("SELECT 1")
+        self.assertLessEqual(len(self.opened), self.pool.size)
+
+    def test_replaces_closed_connection(self):
+        """ A connection closed while idle is replaced on checkout """
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        connection.close()
+
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(replacement.execute("SELECT 1").fetchone(), (1,))
+        self.assertEqual(len(self.opened), 2)
+        self.pool.release(replacement)
+
+        # the slot of the closed connection was freed
+        connections = [self.pool.acquire() for _ in range(self.pool.size)]
+        for connection in connections:
+            self.pool.release(connection)
+
+    def test_exhausted_pool_times_out(self):
+        """ Checkouts beyond the size wait, then raise Empty """
+        connections = [self.pool.acquire() for _ in range(self.pool.size)]
+        start = time.monotonic()
+        with self.assertRaises(Empty):
+            self.pool.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(len(self.opened), self.pool.size)
+        for connection in connections:
+            self.pool.release(connection)
+
+    def test_exhausted_pool_blocks_until_release(self):
+        """ A waiting checkout gets the connection released meanwhile """
+        self.pool.timeout = 5
+        connections = [self.pool.acquire() for _ in range(self.pool.size)]
+        timer = threading.Timer(0.1, self.pool.release, (connections[0],))
+        timer.start()
+
+        connection = self.pool.acquire()
+        timer.join()
+        self.assertIs(connection, connections[0])
+        self.assertEqual(len(self.opened), self.pool.size)
+        self.pool.release(connection)
+        self.pool.release(connections[1])
+
+    def test_exhausted_pool_wakes_on_discard(self):
+        """ A waiting checkout opens a new connection when another one
+        is discarded, e.g. because its rollback failed """
+        self.pool.size = 1
+        self.pool.timeout = None
+        connection = self.pool.acquire()
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(self.pool.acquire()),
+            daemon=True)
+        waiter.start()
+        time.sleep(0.1)
+
+        connection.close()
+        self.pool.release(connection)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(acquired), 1)
+        self.assertIsNot(acquired[0], connection)
+        self.assertEqual(len(self.opened), 2)
+        self.pool.release(acquired[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
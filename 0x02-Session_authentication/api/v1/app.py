@@ -2,20 +2,29 @@
 """
 Route module for the API
 """
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import CORS
 from os import getenv
-from api.v1.auth.basic_auth import BasicAuth
+from api.v1 import timing
+from api.v1.auth import get_auth
+from api.v1.views import app_views
+import time
 
 app = Flask(__name__)
+app.register_blueprint(app_views)
 app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
-authentication = None
-authentication_type = getenv("AUTH_TYPE")
+# paths served without authentication, "*" ends a prefix
+EXCLUDED_PATHS = ('/api/v1/status/',
+                  '/api/v1/unauthorized/',
+                  '/api/v1/forbidden/',
+                  '/api/v1/auth_session/login/')
+if getenv("API_METRICS_PUBLIC", "0") == "1":
+    # for Prometheus scrapers without credentials
+    EXCLUDED_PATHS += ('/api/v1/metrics/',)
 
-if authentication_type == "basic_auth":
-    authentication = BasicAuth()
+auth = get_auth()
 
 @app.errorhandler(404)
 def handle_not_found(error) -> str:
@@ -32,32 +41,51 @@ def handle_forbidden(error) -> str:
     """ Handles 403 Forbidden error """
     return jsonify({"error": "Forbidden"}), 403
 
+
+if timing.ENABLED:
+    @app.before_request
+    def start_timing() -> None:
+        """ Starts the clock of the request """
+        g.request_start = time.perf_counter()
+
+
 @app.before_request
+@timing.timed("auth")
 def validate_request() -> str:
     """ Before Request Handler
     Validates incoming requests, including authentication checks.
     """
-    if authentication is None:
+    if auth is None:
         return
 
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/',
-                      '/api/v1/auth_session/login/']  # Add the new path here
-
-    if not authentication.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
-    if authentication.authorization_header(request) is None and authentication.session_cookie(request) is None:
+    if auth.authorization_header(request) is None and \
+            auth.session_cookie(request) is None:
         abort(401)
 
-    if authentication.authorization_header(request) is None:
-        abort(401)
-
-    if authentication.current_user(request) is None:
+    if auth.resolve_current_user(request) is None:
         abort(403)
 
-    request.current_user = authentication.current_user(request)  # Assigning current user
+
+if timing.ENABLED:
+    @app.before_request
+    def start_view_timing() -> None:
+        """ Starts the clock of the view, once authenticated """
+        g.view_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        """ Records the view and the request, and lists the stages of
+        the request in its Server-Timing header """
+        now = time.perf_counter()
+        if g.get("view_start") is not None:
+            timing.observe("view", now - g.view_start)
+        if g.get("request_start") is not None:
+            timing.observe("total", now - g.request_start)
+        response.headers["Server-Timing"] = timing.server_timing()
+        return response
 
 @app.route('/api/v1/status')
 def get_status():
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+""" Authentication package
+"""
+from os import getenv
+from threading import Lock
+
+
+AUTH_TYPES = {
+    "basic_auth": ("api.v1.auth.basic_auth", "BasicAuth"),
+    "session_auth": ("api.v1.auth.session_auth", "SessionAuth"),
+    "session_exp_auth": ("api.v1.auth.session_exp_auth", "SessionExpAuth"),
+    "session_db_auth": ("api.v1.auth.session_db_auth", "SessionDBAuth"),
+    "session_token_auth": ("api.v1.auth.session_token_auth",
+                           "SessionTokenAuth"),
+}
+
+_auth = {}
+_auth_lock = Lock()
+
+
+def get_auth():
+    """ Returns the Auth instance chosen by AUTH_TYPE, None without one
+
+    It is built once per process and shared by app.py and the views,
+    also when app.py runs as __main__ and is imported again by them.
+    """
+    if "auth" not in _auth:
+        with _auth_lock:
+            if "auth" not in _auth:
+                _auth["auth"] = _build_auth(getenv("AUTH_TYPE"))
+    return _auth["auth"]
+
+
+def _build_auth(auth_type: str):
+    """ Instantiates the Auth class of an AUTH_TYPE """
+    if auth_type not in AUTH_TYPES:
+        return None
+    module_name, class_name = AUTH_TYPES[auth_type]
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)()
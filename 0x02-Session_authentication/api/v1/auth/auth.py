@@ -1,31 +1,44 @@
 #!/usr/bin/env python3
 """ Module for Authentication Handling """
+from api.v1 import timing
+from api.v1.auth.path_matcher import PathMatcher
 from flask import request
 from typing import List, TypeVar
 from os import getenv
 
 
+_UNRESOLVED = object()
+
+
 class Auth:
     """ Class for managing API authentication """
 
+    @timing.timed("require_auth")
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """ Checks if authentication is required for a given path """
-        if path is None or excluded_paths is None or excluded_paths == []:
+        """ Checks if authentication is required for a given path
+
+        Tuples of excluded paths (e.g. EXCLUDED_PATHS of api.v1.app) are
+        compiled once and reused; lists are compiled at each call, as
+        they may change.
+        """
+        if path is None or not excluded_paths:
             return True
 
-        is_slash_path = path[-1] == '/'  # Check if the path ends with a slash
+        return not self._path_matcher(excluded_paths).match(path)
 
-        tmp_path = path if is_slash_path else path + '/'
-        
-        for exc in excluded_paths:
-            if exc.endswith('*'):
-                if exc[:-1] == path[:len(exc) - 1]:
-                    return False
-            elif tmp_path == exc:
-                return False
+    def _path_matcher(self, excluded_paths) -> PathMatcher:
+        """ Returns the compiled matcher of excluded paths """
+        if not isinstance(excluded_paths, tuple):
+            return PathMatcher(excluded_paths)
 
-        return True
+        compiled = getattr(self, '_compiled_paths', None)
+        if compiled is None or compiled[0] is not excluded_paths:
+            compiled = (excluded_paths, PathMatcher(excluded_paths))
+            self._compiled_paths = compiled
 
+        return compiled[1]
+
+    @timing.timed("authorization_header")
     def authorization_header(self, request=None) -> str:
         """ Retrieves the Authorization header from the request """
         if request is None:
@@ -37,6 +50,23 @@ class Auth:
         """ Validates the current user """
         return None
 
+    @timing.timed("current_user")
+    def resolve_current_user(self, request=None) -> TypeVar('User'):
+        """ Resolves the current user once per request and caches it
+        on the request as request.current_user
+        """
+        if request is None:
+            return None
+
+        user = getattr(request, 'current_user', _UNRESOLVED)
+
+        if user is _UNRESOLVED:
+            user = self.current_user(request)
+            request.current_user = user
+
+        return user
+
+    @timing.timed("session_cookie")
     def session_cookie(self, request=None):
         """ Returns the value of the session cookie from the request """
         if request is None:
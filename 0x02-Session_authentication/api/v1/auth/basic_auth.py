@@ -1,13 +1,34 @@
 #!/usr/bin/env python3
 """ Module for Basic Authentication """
+from api.v1 import timing
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
 from base64 import b64decode
 from models.user import User
+from os import getenv
 from typing import TypeVar
 
 class BasicAuth(Auth):
     """ Class for Basic Authentication """
 
+    def __init__(self):
+        """ Constructor method for BasicAuth
+
+        BASIC_AUTH_CACHE_SIZE > 0 enables the verified-credential cache,
+        entries live BASIC_AUTH_CACHE_TTL seconds (default 60)
+        """
+        try:
+            cache_size = int(getenv('BASIC_AUTH_CACHE_SIZE', '0'))
+            cache_ttl = float(getenv('BASIC_AUTH_CACHE_TTL', '60'))
+        except ValueError:
+            cache_size = 0
+            cache_ttl = 0
+
+        self.credential_cache = None
+
+        if cache_size > 0 and cache_ttl > 0:
+            self.credential_cache = CredentialCache(cache_size, cache_ttl)
+
     def extract_base64_authorization_header(self, auth_header_str: str) -> str:
         """ Extracts Base64 Authorization Header """
         if auth_header_str is None:
@@ -23,6 +44,7 @@ class BasicAuth(Auth):
 
         return encoded_part
 
+    @timing.timed("base64_decode")
     def decode_base64_authorization_header(self, encoded_str: str) -> str:
         """ Decodes the value of a base64 string """
         if encoded_str is None:
@@ -70,12 +92,15 @@ class BasicAuth(Auth):
             return None
 
         try:
-            found_users = User.search({'email': email_str})
+            with timing.stage("user_search"):
+                found_users = User.search({'email': email_str})
         except Exception:
             return None
 
         for user in found_users:
-            if user.is_valid_password(pwd_str):
+            with timing.stage("password_check"):
+                is_valid = user.is_valid_password(pwd_str)
+            if is_valid:
                 return user
 
         return None
@@ -87,6 +112,11 @@ class BasicAuth(Auth):
         if not auth_header:
             return None
 
+        user = self.cached_user(auth_header)
+
+        if user is not None:
+            return user
+
         encoded_part = self.extract_base64_authorization_header(auth_header)
 
         if not encoded_part:
@@ -104,4 +134,33 @@ class BasicAuth(Auth):
 
         user = self.user_object_from_credentials(email, pwd)
 
+        if user is not None and self.credential_cache is not None:
+            self.credential_cache.put(auth_header, (user.id, user.password))
+
+        return user
+
+    def cached_user(self, auth_header: str) -> TypeVar('User'):
+        """
+        Returns the User cached for an Authorization header, provided
+        it still exists with the same password
+        """
+        if self.credential_cache is None:
+            return None
+
+        cached = self.credential_cache.get(auth_header)
+
+        if cached is None:
+            return None
+
+        user_id, password = cached
+
+        try:
+            user = User.get(user_id)
+        except Exception:
+            user = None
+
+        if user is None or user.password != password:
+            self.credential_cache.invalidate(auth_header)
+            return None
+
         return user
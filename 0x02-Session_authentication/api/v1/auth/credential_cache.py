@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+""" Module for caching verified credentials """
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import hmac
+import os
+import time
+
+
+class CredentialCache:
+    """ Bounded LRU + TTL cache of verified credentials
+
+    Keys are HMAC-SHA256 digests of the raw credential (e.g. the
+    Authorization header) under a per-process random key, so the cache
+    never holds a usable secret.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        """ Initializes an empty cache """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, credential: str):
+        """ Returns the value cached for a credential, or None """
+        digest = self._digest(credential)
+
+        with self._lock:
+            entry = self._entries.get(digest)
+
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, credential: str, value) -> None:
+        """ Caches the value of a verified credential """
+        digest = self._digest(credential)
+
+        with self._lock:
+            self._entries[digest] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(digest)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, credential: str) -> None:
+        """ Drops the value cached for a credential """
+        digest = self._digest(credential)
+
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """ Returns the cache counters """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _digest(self, credential: str) -> bytes:
+        """ Keyed hash of a credential """
+        return hmac.new(self._key, credential.encode('utf-8'),
+                        hashlib.sha256).digest()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+""" Module for matching request paths against excluded paths """
+from typing import Iterable
+
+
+class PathMatcher:
+    """ Excluded paths compiled once, with the rules of
+    Auth.require_auth:
+      - "/api/v1/status/" matches "/api/v1/status" and
+        "/api/v1/status/" (a trailing slash is added to the path)
+      - "/api/v1/stat*" matches every path starting with "/api/v1/stat"
+
+    Exact paths are a set; prefixes are a set per length, so a match
+    costs one lookup per distinct prefix length, whatever the number
+    of paths.
+    """
+
+    def __init__(self, excluded_paths: Iterable[str]):
+        """ Compiles the excluded paths """
+        self.exact = set()
+        self.prefixes = set()
+        for excluded_path in excluded_paths:
+            if excluded_path.endswith('*'):
+                self.prefixes.add(excluded_path[:-1])
+            else:
+                self.exact.add(excluded_path)
+        self.prefix_lengths = sorted({len(p) for p in self.prefixes})
+
+    def match(self, path: str) -> bool:
+        """ Returns True if the path is excluded """
+        slash_path = path if path.endswith('/') else path + '/'
+        if slash_path in self.exact:
+            return True
+
+        for length in self.prefix_lengths:
+            if length > len(path):
+                break
+            if path[:length] in self.prefixes:
+                return True
+
+        return False
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+""" Local stand-in for a Redis server
+
+Speaks enough RESP for RedisStore: PING, GET, SET [EX], DEL, SELECT,
+FLUSHDB. For development and tests, not for production.
+
+Usage:
+    python3 -m api.v1.auth.resp_server [port]
+"""
+import socketserver
+import sys
+import threading
+import time
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """ Serves the commands of one connection """
+
+    def handle(self):
+        """ Reads commands until the client disconnects """
+        while True:
+            try:
+                args = self._command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.server.execute(args))
+
+    def _command(self) -> list:
+        """ Reads one RESP array of bulk strings """
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if line[:1] != b"*":
+            # inline command, e.g. from telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    """ Thread per connection server over one dict """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple = ("127.0.0.1", 6379)):
+        """ Binds the server """
+        super().__init__(address, RESPHandler)
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def execute(self, args: list) -> bytes:
+        """ Runs a command and returns its encoded reply """
+        name = args[0].upper() if args else b""
+        with self.lock:
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name in (b"SELECT", b"FLUSHDB"):
+                if name == b"FLUSHDB":
+                    self.data.clear()
+                    self.expires.clear()
+                return b"+OK\r\n"
+            if name == b"GET" and len(args) == 2:
+                value = self._get(args[1])
+                if value is None:
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == b"SET" and len(args) in (3, 5):
+                self.data[args[1]] = args[2]
+                self.expires.pop(args[1], None)
+                if len(args) == 5 and args[3].upper() == b"EX":
+                    self.expires[args[1]] = time.monotonic() + int(args[4])
+                return b"+OK\r\n"
+            if name == b"DEL" and len(args) > 1:
+                deleted = 0
+                for key in args[1:]:
+                    if self._get(key) is not None:
+                        del self.data[key]
+                        self.expires.pop(key, None)
+                        deleted += 1
+                return b":%d\r\n" % deleted
+        return b"-ERR unknown command or wrong number of arguments\r\n"
+
+    def _get(self, key: bytes) -> bytes:
+        """ Value of a key, dropping it once expired """
+        expires = self.expires.get(key)
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            del self.expires[key]
+        return self.data.get(key)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    with RESPServer(("127.0.0.1", port)) as server:
+        server.serve_forever()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """ Module for Session Authentication
 """
+from api.v1 import timing
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import get_session_store
 from models.user import User
 import uuid
 
@@ -10,6 +12,8 @@ class SessionAuth(Auth):
     """Session Authentication Class"""
 
     user_id_by_session_id = {}
+    # shared by all the instances, like the dict of the "memory" store
+    session_store = get_session_store(user_id_by_session_id)
 
     def create_session(self, user_id: str = None) -> str:
         """Creates a new session for the given user ID.
@@ -25,9 +29,19 @@ class SessionAuth(Auth):
             return None
 
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.store_session(session_id, user_id)
         return session_id
 
+    def store_session(self, session_id: str, user_id: str) -> None:
+        """Stores a new session in the session store.
+
+        Args:
+            session_id (str): The session ID.
+            user_id (str): The ID of the user.
+        """
+
+        self.session_store.set(session_id, user_id)
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """Retrieves the user ID associated with a session ID.
 
@@ -41,7 +55,8 @@ class SessionAuth(Auth):
         if not isinstance(session_id, str) or session_id is None:
             return None
 
-        return self.user_id_by_session_id.get(session_id)
+        with timing.stage("session_store"):
+            return self.session_store.get(session_id)
 
     def current_user(self, request=None):
         """Returns the current user based on the session ID extracted from the request.
@@ -60,7 +75,8 @@ class SessionAuth(Auth):
 
         user_id = self.user_id_for_session_id(session_id)
 
-        return User.get(user_id)
+        with timing.stage("user_get"):
+            return User.get(user_id)
 
     def destroy_session(self, request=None):
         """Destroys the user session, effectively logging the user out.
@@ -85,9 +101,6 @@ class SessionAuth(Auth):
         if not user_id:
             return False
 
-        try:
-            del self.user_id_by_session_id[session_id]
-        except KeyError:
-            pass
+        self.session_store.delete(session_id)
 
         return True
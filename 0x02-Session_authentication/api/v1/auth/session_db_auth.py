@@ -1,10 +1,28 @@
+from api.v1 import timing
 from api.v1.auth.session_exp_auth import SessionExpAuth
-from datetime import datetime, timedelta
 from models.user_session import UserSession
 
 class SessionDBAuth(SessionExpAuth):
     """Class for Session Authentication with Database Storage"""
 
+    def __init__(self):
+        """Constructor method, indexes the deadlines of the sessions
+        already in the database"""
+        super().__init__()
+
+        if self.session_duration > 0:
+            UserSession.reload_if_changed()
+            for user_session in UserSession.all():
+                self.schedule_expiry(user_session.session_id,
+                                     self.persisted_at(user_session))
+
+    def persisted_at(self, user_session):
+        """Start of the expiry of a session in the database: its
+        creation, or its last persisted request when sliding"""
+        if self.sliding:
+            return user_session.updated_at
+        return user_session.created_at
+
     def create_session(self, user_id=None):
         """Create session and store in the database"""
         session_id = super().create_session(user_id)
@@ -15,7 +33,6 @@ class SessionDBAuth(SessionExpAuth):
         kwargs = {'user_id': user_id, 'session_id': session_id}
         user_session = UserSession(**kwargs)
         user_session.save()
-        UserSession.save_to_file()
 
         return session_id
 
@@ -24,22 +41,79 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
 
-        UserSession.load_from_file()
-        user_sessions = UserSession.search({'session_id': session_id})
+        # the session store is shared by the workers with the "sqlite"
+        # and "redis" backends, the database is the fallback
+        user_id = super().user_id_for_session_id(session_id)
+        if user_id is not None and self.session_store.shared:
+            return user_id
+
+        with timing.stage("session_reload"):
+            UserSession.reload_if_changed()
+        with timing.stage("session_search"):
+            user_sessions = UserSession.search({'session_id': session_id})
 
         if not user_sessions:
+            if user_id is not None:
+                # the "memory" store is this worker's own: another
+                # worker may have destroyed the session since
+                self.session_store.delete(session_id)
+                self.forget_session(session_id)
             return None
+        if user_id is not None:
+            return user_id
 
         user_session = user_sessions[0]
+        persisted_at = self.persisted_at(user_session)
 
-        expired_time = user_session.created_at + \
-            timedelta(seconds=self.session_duration)
-
-        if expired_time < datetime.utcnow():
+        if self.is_expired(self.seen_at(session_id, persisted_at)):
+            self.sweeper.count_expired()
             return None
 
+        if self.sliding:
+            session_data = {"user_id": user_session.user_id,
+                            "created_at": user_session.created_at}
+            self.touch(session_id, session_data, persisted_at)
+        elif self.session_duration > 0:
+            # sessions of other workers, or of before a restart
+            self.schedule_expiry(session_id, persisted_at)
+
         return user_session.user_id
 
+    def persisted_seen(self, session_id):
+        """Last request of a session persisted in the session store
+        or in the database"""
+        seen_at = super().persisted_seen(session_id)
+        for user_session in UserSession.search({'session_id': session_id}):
+            if seen_at is None or user_session.updated_at > seen_at:
+                seen_at = user_session.updated_at
+        return seen_at
+
+    def write_touches(self, touches):
+        """Write a batch of last request times to the session store and
+        to the database, with a single database write"""
+        super().write_touches(touches)
+
+        user_sessions = []
+        for session_id, (_, seen_at) in touches.items():
+            for user_session in UserSession.search(
+                    {'session_id': session_id}):
+                user_session.updated_at = seen_at
+                user_sessions.append(user_session)
+        UserSession.save_many(user_sessions)
+
+    def reap_sessions(self, session_ids):
+        """Drop a batch of expired sessions from the session store and
+        the database, with a single database write"""
+        kept = super().reap_sessions(session_ids)
+
+        user_sessions = []
+        for session_id in session_ids:
+            if session_id not in kept:
+                user_sessions += UserSession.search(
+                    {'session_id': session_id})
+        UserSession.remove_many(user_sessions)
+        return kept
+
     def destroy_session(self, request=None):
         """Remove Session from the Database"""
         if request is None:
@@ -60,10 +134,11 @@ class SessionDBAuth(SessionExpAuth):
             return False
 
         user_session = user_sessions[0]
+        self.session_store.delete(session_id)
+        self.forget_session(session_id)
 
         try:
             user_session.remove()
-            UserSession.save_to_file()
         except Exception:
             return False
 
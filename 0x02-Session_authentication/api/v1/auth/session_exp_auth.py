@@ -1,9 +1,20 @@
+from api.v1 import timing
 from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_sweeper import SessionSweeper
 from datetime import datetime, timedelta
 from os import getenv
+from threading import Lock
 
 class SessionExpAuth(SessionAuth):
-    """Class for Session Authentication with Expiration"""
+    """Class for Session Authentication with Expiration
+
+    SESSION_EXPIRATION is "absolute" (default, SESSION_DURATION from
+    the creation) or "sliding" (SESSION_DURATION from the last
+    request). Sliding sessions keep their last request time in memory
+    and persist it only once it drifted SESSION_TOUCH_GRANULARITY
+    seconds from the persisted one, SESSION_TOUCH_BATCH sessions (or
+    one sweep interval) at a time.
+    """
 
     def __init__(self):
         """Constructor method for SessionExpAuth"""
@@ -13,37 +24,189 @@ class SessionExpAuth(SessionAuth):
             session_duration = 0
 
         self.session_duration = max(0, session_duration)
+        self.sliding = self.session_duration > 0 and \
+            getenv('SESSION_EXPIRATION', 'absolute') == 'sliding'
+        self.touch_granularity = timedelta(
+            seconds=max(0, int(getenv('SESSION_TOUCH_GRANULARITY', '60'))))
+        self.touch_batch = max(1, int(getenv('SESSION_TOUCH_BATCH', '100')))
+        self.touch_counts = {"touches": 0, "persisted": 0, "flushes": 0}
+        self.last_seen = {}
+        self._touches = {}
+        self._touch_lock = Lock()
+        self.sweeper = SessionSweeper(
+            self.reap_sessions,
+            float(getenv('SESSION_SWEEP_INTERVAL', '10')),
+            int(getenv('SESSION_SWEEP_BATCH', '500')),
+            self.flush_touches if self.sliding else None)
 
-    def create_session(self, user_id=None):
-        """Create a session with expiration"""
-        session_id = super().create_session(user_id)
-
-        if session_id is None:
-            return None
+    def session_ttl(self):
+        """Seconds the session store keeps a session after a write;
+        sliding sessions may be seen up to the granularity after"""
+        if self.sliding:
+            return self.session_duration + \
+                int(self.touch_granularity.total_seconds())
+        return self.session_duration or None
 
+    def store_session(self, session_id, user_id):
+        """Store a session with its creation time, expiring it in the
+        session store too"""
         session_data = {
             "user_id": user_id,
             "created_at": datetime.utcnow()
         }
 
-        self.user_id_by_session_id[session_id] = session_data
+        self.session_store.set(session_id, session_data, self.session_ttl())
+        self.schedule_expiry(session_id, session_data["created_at"])
+
+    def schedule_expiry(self, session_id, seen_at):
+        """Index the deadline of a session for the sweeper, seen_at is
+        its creation or its last persisted request"""
+        if self.session_duration > 0:
+            self.sweeper.schedule(
+                session_id,
+                seen_at + timedelta(seconds=self.session_ttl()))
+
+    def persisted_seen(self, session_id):
+        """Last request (or creation) of a session as persisted by any
+        process, None if the session is gone"""
+        session_data = self.session_store.get(session_id)
+        if not isinstance(session_data, dict):
+            return None
+        return session_data.get('last_seen') or session_data.get('created_at')
+
+    def reap_sessions(self, session_ids):
+        """Drop a batch of expired sessions, called by the sweeper.
+        Returns the sliding sessions seen since, rescheduled instead"""
+        kept = []
+        if self.sliding:
+            now = datetime.utcnow()
+            expired = []
+            for session_id in session_ids:
+                seen_at = self.seen_at(session_id,
+                                       self.persisted_seen(session_id))
+                if seen_at is not None and \
+                        not self.is_expired(seen_at, now):
+                    kept.append(session_id)
+                    self.schedule_expiry(session_id, seen_at)
+                else:
+                    expired.append(session_id)
+            session_ids = expired
+
+        for session_id in session_ids:
+            self.forget_session(session_id)
+        self.session_store.delete_many(session_ids)
+        return kept
+
+    def seen_at(self, session_id, persisted_seen):
+        """Last request of a session, in memory or persisted"""
+        seen_at = self.last_seen.get(session_id)
+        if seen_at is None or persisted_seen is not None and \
+                persisted_seen > seen_at:
+            return persisted_seen
+        return seen_at
+
+    def is_expired(self, seen_at, now=None):
+        """Whether a session seen (or created) at seen_at expired"""
+        if self.session_duration <= 0:
+            return False
+        expiration_time = seen_at + timedelta(seconds=self.session_duration)
+        return expiration_time < (now or datetime.utcnow())
+
+    def touch(self, session_id, session_data, persisted_seen):
+        """Record a request on a sliding session, queueing its write
+        once it drifted past the granularity"""
+        now = datetime.utcnow()
+        with self._touch_lock:
+            if session_id not in self.last_seen and \
+                    session_id not in self._touches:
+                # a session of another process, or of before a restart
+                self.schedule_expiry(session_id, persisted_seen)
+            self.last_seen[session_id] = now
+            self.touch_counts["touches"] += 1
+            if session_id in self._touches:
+                self._touches[session_id] = (session_data, now)
+            elif now - persisted_seen >= self.touch_granularity:
+                self._touches[session_id] = (session_data, now)
+            full = len(self._touches) >= self.touch_batch
+
+        if full:
+            self.flush_touches()
 
-        return session_id
+    def flush_touches(self):
+        """Persist the queued last request times"""
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+        if not touches:
+            return
+
+        try:
+            self.write_touches(touches)
+        except Exception:
+            with self._touch_lock:
+                for session_id, touch in touches.items():
+                    self._touches.setdefault(session_id, touch)
+            raise
+
+        with self._touch_lock:
+            self.touch_counts["persisted"] += len(touches)
+            self.touch_counts["flushes"] += 1
+        for session_id, (_, seen_at) in touches.items():
+            self.schedule_expiry(session_id, seen_at)
+
+    def write_touches(self, touches):
+        """Write a batch of last request times to the session store"""
+        self.session_store.set_many(
+            {session_id: dict(session_data, last_seen=seen_at)
+             for session_id, (session_data, seen_at) in touches.items()},
+            self.session_ttl())
+
+    def forget_session(self, session_id):
+        """Drop what this process knows of a session"""
+        self.sweeper.cancel(session_id)
+        with self._touch_lock:
+            self.last_seen.pop(session_id, None)
+            self._touches.pop(session_id, None)
+
+    def session_stats(self):
+        """Counters of the sweeper and of the sliding writes"""
+        stats = self.sweeper.stats()
+        with self._touch_lock:
+            stats.update(self.touch_counts)
+        return stats
 
     def user_id_for_session_id(self, session_id=None):
         """Retrieve user_id from session_id, considering expiration"""
-        if session_id is None or session_id not in self.user_id_by_session_id:
+        if session_id is None:
+            return None
+
+        with timing.stage("session_store"):
+            session_data = self.session_store.get(session_id)
+        if not isinstance(session_data, dict):
             return None
 
-        session_data = self.user_id_by_session_id[session_id]
         created_at = session_data.get('created_at')
 
         if created_at is None:
             return None
 
-        if self.session_duration > 0:
-            expiration_time = created_at + timedelta(seconds=self.session_duration)
-            if expiration_time < datetime.utcnow():
+        if self.sliding:
+            persisted_seen = session_data.get('last_seen') or created_at
+            if self.is_expired(self.seen_at(session_id, persisted_seen)):
+                self.sweeper.count_expired()
                 return None
+            self.touch(session_id, session_data, persisted_seen)
+        elif self.is_expired(created_at):
+            self.sweeper.count_expired()
+            return None
 
         return session_data.get('user_id')
+
+    def destroy_session(self, request=None):
+        """Destroy a session and forget its deadline"""
+        session_id = self.session_cookie(request) if request else None
+
+        if not super().destroy_session(request):
+            return False
+
+        self.forget_session(session_id)
+        return True
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+""" Module for session stores
+
+SESSION_STORE selects where SessionAuth keeps its sessions:
+  - "memory" (default): a dict of this process
+  - "sqlite": a SQLite file (SESSION_STORE_PATH) shared by the
+    processes of one host
+  - "redis": a Redis server (SESSION_STORE_URL), or the local
+    stand-in of api.v1.auth.resp_server
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from os import getenv
+from urllib.parse import urlparse
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+
+DATETIME_MARKER = "__datetime__"
+
+
+def encode(value) -> str:
+    """ JSON of a session value, datetimes included """
+    def _default(obj):
+        if isinstance(obj, datetime):
+            return {DATETIME_MARKER: obj.isoformat()}
+        raise TypeError("{} is not JSON serializable".format(type(obj)))
+
+    return json.dumps(value, default=_default)
+
+
+def decode(data):
+    """ Session value of its JSON """
+    def _hook(obj: dict):
+        if len(obj) == 1 and DATETIME_MARKER in obj:
+            return datetime.fromisoformat(obj[DATETIME_MARKER])
+        return obj
+
+    return json.loads(data, object_hook=_hook)
+
+
+class SessionStore(ABC):
+    """ Interface of the session stores
+
+    ttl is in seconds, None for sessions that never expire.
+    """
+
+    # True when the other worker processes see the same sessions
+    shared = True
+
+    @abstractmethod
+    def get(self, session_id: str):
+        """ Returns the value of a session, or None """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, session_id: str, value, ttl: int = None) -> None:
+        """ Stores the value of a session """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """ Drops a session, True if it existed """
+        raise NotImplementedError
+
+    def set_many(self, values: dict, ttl: int = None) -> None:
+        """ Stores the values of sessions, by session ID """
+        for session_id, value in values.items():
+            self.set(session_id, value, ttl)
+
+    def delete_many(self, session_ids: list) -> int:
+        """ Drops sessions, returns how many existed """
+        return sum(1 for session_id in session_ids if self.delete(session_id))
+
+
+class MemoryStore(SessionStore):
+    """ Sessions in a dict of this process
+
+    Values are kept as is, without encoding.
+    """
+
+    shared = False
+
+    def __init__(self, sessions: dict = None):
+        """ Initializes the store over a dict """
+        self.sessions = {} if sessions is None else sessions
+        self.expires = {}
+
+    def get(self, session_id: str):
+        """ Returns the value of a session, or None """
+        expires = self.expires.get(session_id)
+        if expires is not None and expires < time.monotonic():
+            self.delete(session_id)
+            return None
+        return self.sessions.get(session_id)
+
+    def set(self, session_id: str, value, ttl: int = None) -> None:
+        """ Stores the value of a session """
+        if ttl:
+            self.expires[session_id] = time.monotonic() + ttl
+        else:
+            self.expires.pop(session_id, None)
+        self.sessions[session_id] = value
+
+    def delete(self, session_id: str) -> bool:
+        """ Drops a session, True if it existed """
+        self.expires.pop(session_id, None)
+        return self.sessions.pop(session_id, None) is not None
+
+
+class SQLiteStore(SessionStore):
+    """ Sessions in a SQLite table, shared by the processes of a host
+
+    Each thread has its own connection; WAL lets readers run while
+    another process writes.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        """ Initializes the store, creating the table if needed """
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id: str):
+        """ Returns the value of a session, or None """
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] < time.time():
+            self.delete(session_id)
+            return None
+        return decode(row[0])
+
+    def set(self, session_id: str, value, ttl: int = None) -> None:
+        """ Stores the value of a session """
+        expires_at = time.time() + ttl if ttl else None
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session_id, encode(value), expires_at))
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            connection.execute(
+                "DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, session_id: str) -> bool:
+        """ Drops a session, True if it existed """
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def set_many(self, values: dict, ttl: int = None) -> None:
+        """ Stores the values of sessions in one transaction """
+        expires_at = time.time() + ttl if ttl else None
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                [(session_id, encode(value), expires_at)
+                 for session_id, value in values.items()])
+
+    def delete_many(self, session_ids: list) -> int:
+        """ Drops sessions in one transaction, returns how many existed """
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN")
+            cursor = connection.executemany(
+                "DELETE FROM sessions WHERE session_id = ?",
+                [(session_id,) for session_id in session_ids])
+        return cursor.rowcount
+
+
+class RedisStore(SessionStore):
+    """ Sessions in a Redis server, spoken to in RESP
+
+    Each thread keeps its own connection and reconnects once when it
+    was dropped.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0",
+                 prefix: str = "session:", timeout: float = 5):
+        """ Initializes the store, without connecting """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self, session_id: str):
+        """ Returns the value of a session, or None """
+        data = self.command("GET", self.prefix + session_id)
+        return None if data is None else decode(data)
+
+    def set(self, session_id: str, value, ttl: int = None) -> None:
+        """ Stores the value of a session """
+        args = ["SET", self.prefix + session_id, encode(value)]
+        if ttl:
+            args += ["EX", str(int(ttl))]
+        self.command(*args)
+
+    def delete(self, session_id: str) -> bool:
+        """ Drops a session, True if it existed """
+        return self.command("DEL", self.prefix + session_id) > 0
+
+    def delete_many(self, session_ids: list) -> int:
+        """ Drops sessions in one command, returns how many existed """
+        if not session_ids:
+            return 0
+        return self.command("DEL", *(self.prefix + session_id
+                                     for session_id in session_ids))
+
+    def command(self, *args: str):
+        """ Sends a command and returns its reply """
+        request = ["*{}\r\n".format(len(args)).encode()]
+        for arg in args:
+            arg = arg.encode() if isinstance(arg, str) else arg
+            request.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        request = b"".join(request)
+
+        for attempt in (0, 1):
+            connection = self._connect()
+            try:
+                connection[0].sendall(request)
+                return self._reply(connection[1])
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt == 1:
+                    raise
+
+    def _connect(self) -> tuple:
+        """ (socket, reader) of the current thread """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.create_connection((self.host, self.port),
+                                            self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = (sock, sock.makefile("rb"))
+            self._local.connection = connection
+            if self.db:
+                self.command("SELECT", str(self.db))
+        return connection
+
+    def _close(self) -> None:
+        """ Drops the connection of the current thread """
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def _reply(self, reader):
+        """ Reads one RESP reply """
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the server")
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            raise RuntimeError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            if int(data) < 0:
+                return None
+            value = reader.read(int(data) + 2)[:-2]
+            return value.decode()
+        if kind == b"*":
+            if int(data) < 0:
+                return None
+            return [self._reply(reader) for _ in range(int(data))]
+        raise ConnectionError("bad reply: {!r}".format(line))
+
+
+def get_session_store(sessions: dict = None) -> SessionStore:
+    """ Returns the store chosen by SESSION_STORE
+
+    sessions is the dict of the "memory" store.
+    """
+    kind = getenv("SESSION_STORE", "memory")
+    if kind == "sqlite":
+        return SQLiteStore(getenv("SESSION_STORE_PATH",
+                                  ".db_sessions.sqlite3"))
+    if kind == "redis":
+        return RedisStore(getenv("SESSION_STORE_URL",
+                                 "redis://localhost:6379/0"))
+    return MemoryStore(sessions)
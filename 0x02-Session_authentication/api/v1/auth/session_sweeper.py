@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+""" Module for reaping expired sessions """
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+import heapq
+import threading
+
+
+class SessionSweeper:
+    """ Expiry index of sessions with a background sweeper thread
+
+    Deadlines are kept in a heap of (expires_at, session_id); a
+    session dropped or rescheduled before its deadline stays in the
+    heap and is skipped when popped. Every `interval` seconds the due
+    sessions are handed to `reap` in lists of at most `batch` IDs;
+    `reap` may return the IDs it kept alive (and rescheduled). `tick`,
+    if given, runs on the thread before each sweep.
+    """
+
+    def __init__(self, reap: Callable[[List[str]], Optional[Iterable]],
+                 interval: float = 10, batch: int = 500,
+                 tick: Callable[[], None] = None):
+        """ Initializes an empty index, the thread starts with the
+        first scheduled session """
+        self.reap = reap
+        self.tick = tick
+        self.interval = interval
+        self.batch = batch
+        self.expired = 0
+        self.reaped = 0
+        self._heap = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, session_id: str, expires_at: datetime) -> None:
+        """ Indexes (or moves) the deadline of a session """
+        with self._lock:
+            self._deadlines[session_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, session_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+
+    def cancel(self, session_id: str) -> None:
+        """ Forgets a session, e.g. destroyed at logout """
+        with self._lock:
+            self._deadlines.pop(session_id, None)
+
+    def count_expired(self) -> None:
+        """ Counts a lookup that found its session expired """
+        with self._lock:
+            self.expired += 1
+
+    def sweep(self, now: datetime = None) -> int:
+        """ Reaps the sessions due by now, returns how many """
+        now = now or datetime.utcnow()
+        reaped = 0
+        while True:
+            due = []
+            with self._lock:
+                while self._heap and self._heap[0][0] <= now \
+                        and len(due) < self.batch:
+                    expires_at, session_id = heapq.heappop(self._heap)
+                    if self._deadlines.get(session_id) == expires_at:
+                        del self._deadlines[session_id]
+                        due.append((expires_at, session_id))
+            if not due:
+                return reaped
+            try:
+                kept = self.reap([session_id for _, session_id in due])
+            except Exception:
+                # put the batch back for the next sweep
+                for expires_at, session_id in due:
+                    self.schedule(session_id, expires_at)
+                raise
+            count = len(due) - len(kept or ())
+            reaped += count
+            with self._lock:
+                self.reaped += count
+
+    def stats(self) -> dict:
+        """ Returns the session counters """
+        return {
+            "live": len(self._deadlines),
+            "expired": self.expired,
+            "reaped": self.reaped,
+        }
+
+    def _run(self) -> None:
+        """ Sweeps every interval """
+        event = threading.Event()
+        while True:
+            event.wait(self.interval)
+            try:
+                if self.tick is not None:
+                    self.tick()
+                self.sweep()
+            except Exception:
+                # the batch was put back, retry at the next interval
+                pass
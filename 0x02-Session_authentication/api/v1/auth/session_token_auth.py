@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+""" Module for Stateless Session Token Authentication
+"""
+from api.v1 import timing
+from api.v1.auth.session_auth import SessionAuth
+from base64 import urlsafe_b64encode
+from os import getenv
+from threading import Lock
+import hashlib
+import hmac
+import os
+import time
+
+
+class SessionTokenAuth(SessionAuth):
+    """Session Authentication with signed tokens instead of session IDs
+
+    The cookie is "<key id>.<user id>.<expires at>.<nonce>.<MAC>": the
+    user ID and the expiry are in the token and an HMAC-SHA256 signs
+    them, so a request costs a MAC check and no lookup.
+
+    SESSION_TOKEN_KEYS is "<key id>:<secret>,...": the first key signs,
+    all of them verify, so a new key is rotated in by putting it first
+    and the old one is dropped once its tokens expired. The keys must
+    be shared by all the workers, so it is required. SESSION_DURATION is
+    the lifetime of the tokens (0: no expiry). Logged out tokens are
+    revoked until they expire; SESSION_TOKEN_REVOKED_MAX set to 0
+    disables it, otherwise the tokens must expire. With the shared
+    "sqlite" and "redis" session stores the revocations are kept there,
+    with the remaining lifetime of the token as TTL, so a logout applies
+    to every worker. With the "memory" store they go to a list of this
+    process, so a logout applies to the serving worker only. That list
+    holds about SESSION_TOKEN_REVOKED_MAX tokens: a revoked token is
+    never dropped before it expires, new logins are refused instead
+    while the list is full.
+    """
+
+    # prefix of the revoked nonces in a shared session store
+    REVOKED_PREFIX = "revoked:"
+
+    def __init__(self):
+        """Constructor method, loads the keys"""
+        try:
+            session_duration = int(getenv('SESSION_DURATION', '0'))
+        except ValueError:
+            session_duration = 0
+
+        self.session_duration = max(0, session_duration)
+        self.keys = {}
+        for entry in getenv('SESSION_TOKEN_KEYS', '').split(','):
+            key_id, _, secret = entry.strip().partition(':')
+            if key_id and secret and '.' not in key_id:
+                self.keys.setdefault(key_id, secret.encode())
+        if not self.keys:
+            raise ValueError("SESSION_TOKEN_KEYS must list at least one "
+                             "<key id>:<secret> for session_token_auth")
+        self.signing_key_id = next(iter(self.keys))
+        self.revoked_max = max(0, int(getenv('SESSION_TOKEN_REVOKED_MAX',
+                                             '10000')))
+        if self.revoked_max > 0 and self.session_duration == 0:
+            raise ValueError("SESSION_DURATION must be set for "
+                             "session_token_auth while "
+                             "SESSION_TOKEN_REVOKED_MAX is not 0")
+        self.revoked = {}
+        self._revoked_lock = Lock()
+
+    def sign(self, key_id: str, payload: str) -> str:
+        """Returns the MAC of a payload under a key"""
+        digest = hmac.new(self.keys[key_id], payload.encode(),
+                          hashlib.sha256).digest()
+        return urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def create_session(self, user_id: str = None) -> str:
+        """Creates a signed token for the given user ID.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            str: The token, None for an invalid user ID or while the
+            revocation list is full.
+        """
+        if not isinstance(user_id, str) or not user_id or '.' in user_id:
+            return None
+
+        if self.revoked_max and not self.session_store.shared and \
+                len(self.revoked) >= self.revoked_max:
+            self.drop_expired_revocations()
+            if len(self.revoked) >= self.revoked_max:
+                return None
+
+        expires_at = 0
+        if self.session_duration > 0:
+            expires_at = int(time.time()) + self.session_duration
+        payload = "{}.{}.{}.{}".format(self.signing_key_id, user_id,
+                                       expires_at, os.urandom(8).hex())
+        return "{}.{}".format(payload, self.sign(self.signing_key_id,
+                                                 payload))
+
+    @timing.timed("token_verify")
+    def verify(self, token: str):
+        """Returns the fields (key id, user id, expires at, nonce) of a
+        valid token, or None"""
+        if not isinstance(token, str) or not token.isascii():
+            return None
+
+        payload, _, mac = token.rpartition('.')
+        fields = payload.split('.')
+        if len(fields) != 4 or fields[0] not in self.keys:
+            return None
+        if not hmac.compare_digest(mac.encode(),
+                                   self.sign(fields[0], payload).encode()):
+            return None
+
+        try:
+            expires_at = int(fields[2])
+        except ValueError:
+            return None
+        if expires_at and expires_at < time.time():
+            return None
+        if self.is_revoked(fields[3]):
+            return None
+
+        return fields[0], fields[1], expires_at, fields[3]
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Retrieves the user ID of a valid token.
+
+        Args:
+            session_id (str): The token.
+
+        Returns:
+            str: The user ID in the token, None if it is not valid.
+        """
+        fields = self.verify(session_id)
+        if fields is None:
+            return None
+
+        return fields[1]
+
+    def destroy_session(self, request=None):
+        """Revokes the token of the request, logging the user out.
+
+        Args:
+            request: The request object.
+
+        Returns:
+            bool: True if the token was valid, False otherwise.
+        """
+        if request is None:
+            return False
+
+        fields = self.verify(self.session_cookie(request))
+        if fields is None:
+            return False
+
+        self.revoke(fields[3], fields[2])
+        return True
+
+    def is_revoked(self, nonce: str) -> bool:
+        """True if the token of this nonce was revoked"""
+        if self.revoked_max == 0:
+            return False
+        if self.session_store.shared:
+            key = self.REVOKED_PREFIX + nonce
+            return self.session_store.get(key) is not None
+        return nonce in self.revoked
+
+    def revoke(self, nonce: str, expires_at: int) -> None:
+        """Revokes a token until it expires: in the shared session
+        store, or in the revocation list of this process, dropping the
+        expired ones when full. Tokens issued before the list filled up
+        are still added past its size"""
+        if self.revoked_max == 0:
+            return
+
+        if self.session_store.shared:
+            ttl = max(1, int(expires_at - time.time()) + 1)
+            self.session_store.set(self.REVOKED_PREFIX + nonce, expires_at,
+                                   ttl)
+            return
+
+        if len(self.revoked) >= self.revoked_max:
+            self.drop_expired_revocations()
+        with self._revoked_lock:
+            self.revoked[nonce] = expires_at
+
+    def drop_expired_revocations(self) -> None:
+        """Drops the revoked tokens that expired since"""
+        now = time.time()
+        with self._revoked_lock:
+            for nonce, expires_at in list(self.revoked.items()):
+                if expires_at < now:
+                    del self.revoked[nonce]
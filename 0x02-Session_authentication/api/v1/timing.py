@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+""" Module for the timing of the request stages
+
+API_TIMING=1 turns it on: the stages of a request (require_auth,
+user_search, password_check, session_reload, view...) are recorded in
+histograms, served by GET /api/v1/metrics in the Prometheus text format
+(authenticated like the other routes, unless API_METRICS_PUBLIC=1),
+and listed in the Server-Timing header of the response. Off, `timed`
+returns the functions as they are and `stage` a shared no-op.
+"""
+from bisect import bisect_left
+from flask import g, has_app_context
+from functools import wraps
+from os import getenv
+from threading import Lock
+from typing import Callable
+import time
+
+
+ENABLED = getenv("API_TIMING", "0") == "1"
+
+# seconds, from 50 microseconds (a dict lookup) to 5 seconds
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class Histogram:
+    """ Durations of one stage, in BUCKETS """
+
+    def __init__(self):
+        """ Initializes an empty histogram """
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, seconds: float) -> None:
+        """ Records a duration """
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self) -> tuple:
+        """ Returns (cumulative bucket counts, sum, count) """
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+HISTOGRAMS = {}
+_HISTOGRAMS_LOCK = Lock()
+
+
+def histogram(name: str) -> Histogram:
+    """ Returns the histogram of a stage, created on first use """
+    found = HISTOGRAMS.get(name)
+    if found is None:
+        with _HISTOGRAMS_LOCK:
+            found = HISTOGRAMS.setdefault(name, Histogram())
+    return found
+
+
+def observe(name: str, seconds: float) -> None:
+    """ Records the duration of a stage, and adds it to the
+    Server-Timing of the current request """
+    histogram(name).observe(seconds)
+    if has_app_context():
+        timings = g.setdefault("server_timing", {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+class _Stage:
+    """ Context manager timing a stage """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        """ Initializes the stage """
+        self.name = name
+
+    def __enter__(self):
+        """ Starts the clock """
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        """ Records the duration, errors included """
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoStage:
+    """ Context manager doing nothing, when timing is off """
+
+    def __enter__(self):
+        """ Does nothing """
+        return self
+
+    def __exit__(self, *exc_info):
+        """ Does nothing """
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """ Returns a context manager timing a stage """
+    if not ENABLED:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def timed(name: str) -> Callable:
+    """ Decorator timing each call of a function as a stage """
+    def decorator(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing() -> str:
+    """ Server-Timing header of the current request, in milliseconds """
+    timings = g.get("server_timing") or {}
+    return ", ".join("{};dur={:.3f}".format(name, seconds * 1000)
+                     for name, seconds in timings.items())
+
+
+def render() -> str:
+    """ Histograms in the Prometheus text format """
+    name = "api_stage_duration_seconds"
+    lines = ["# HELP {} Duration of the request stages.".format(name),
+             "# TYPE {} histogram".format(name)]
+    for stage_name in sorted(HISTOGRAMS):
+        cumulative, total, count = HISTOGRAMS[stage_name].snapshot()
+        bounds = ["{:g}".format(bucket) for bucket in BUCKETS] + ["+Inf"]
+        for bound, bucket_count in zip(bounds, cumulative):
+            lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                name, stage_name, bound, bucket_count))
+        lines.append('{}_sum{{stage="{}"}} {!r}'.format(name, stage_name,
+                                                        total))
+        lines.append('{}_count{{stage="{}"}} {}'.format(name, stage_name,
+                                                        count))
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, Response
+from api.v1 import timing
 from api.v1.views import app_views
 
 
@@ -20,11 +21,29 @@ def stats() -> str:
     Return:
       - the number of each objects
     """
+    from api.v1.auth import get_auth
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    session_stats = getattr(get_auth(), 'session_stats', None)
+    if session_stats is not None:
+        stats['sessions'] = session_stats()
     return jsonify(stats)
 
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - the stage histograms in the Prometheus text format, 404 when
+        API_TIMING is off
+    """
+    if not timing.ENABLED:
+        abort(404)
+    return Response(timing.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """ GET /api/v1/unauthorized
@@ -34,11 +34,15 @@ def login():
         if not user.is_valid_password(password):
             return jsonify({"error": "Wrong password"}), 401
 
-    from api.v1.app import auth
+    from api.v1.auth import get_auth
+    auth = get_auth()
 
     user = found_users[0]
     session_id = auth.create_session(user.id)
 
+    if session_id is None:
+        return jsonify({"error": "Cannot create a session"}), 503
+
     SESSION_NAME = getenv("SESSION_NAME")
 
     response = jsonify(user.to_json())
@@ -55,7 +59,8 @@ def logout():
     Returns:
         - Empty dictionary if successful
     """
-    from api.v1.app import auth
+    from api.v1.auth import get_auth
+    auth = get_auth()
 
     deleted = auth.destroy_session(request)
 
@@ -1,17 +1,97 @@
 #!/usr/bin/env python3
 """Module containing views for User resources."""
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from flask import Response, abort, jsonify, request
 from models.user import User
+import json
+
+PAGE_LIMIT_DEFAULT = 100
+PAGE_LIMIT_MAX = 1000
+STREAM_CHUNK = 500
+NDJSON = 'application/x-ndjson'
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """GET /api/v1/users
+    Query parameters (optional):
+        - limit: page size (default 100, at most 1000)
+        - after: cursor returned as "next" by the previous page
+        - fields: comma separated list of attributes to return
+        - stream=1 (or "Accept: application/x-ndjson"): stream every
+          User as one JSON object per line
     Returns:
-        JSON representation of a list of all User objects.
+        JSON representation of a list of all User objects, or of
+        {"users": [...], "next": cursor} when paginated.
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    accepted = request.accept_mimetypes.best_match(['application/json',
+                                                    NDJSON])
+    if request.args.get('stream') == '1' or accepted == NDJSON:
+        fields = None
+        if request.args.get('fields'):
+            fields = request.args.get('fields').split(',')
+        return Response(stream_users(fields), mimetype=NDJSON)
+
+    if not any(k in request.args for k in ('limit', 'after', 'fields')):
+        all_users = [user.to_json() for user in User.all()]
+        return jsonify(all_users)
+
+    try:
+        limit = int(request.args.get('limit', PAGE_LIMIT_DEFAULT))
+        after = decode_cursor(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': "Wrong format"}), 400
+    if limit < 1:
+        return jsonify({'error': "Wrong format"}), 400
+    limit = min(limit, PAGE_LIMIT_MAX)
+
+    fields = None
+    if request.args.get('fields'):
+        fields = request.args.get('fields').split(',')
+
+    users = User.page(after, limit)
+    page = [project(user.to_json(), fields) for user in users]
+    next_cursor = None
+    if len(users) == limit:
+        next_cursor = encode_cursor(users[-1].id)
+    return jsonify({'users': page, 'next': next_cursor})
+
+
+def stream_users(fields: list = None):
+    """Yield every User as a NDJSON line, STREAM_CHUNK users at a time."""
+    after = None
+    while True:
+        users = User.page(after, STREAM_CHUNK)
+        for user in users:
+            yield json.dumps(project(user.to_json(), fields)) + '\n'
+        if len(users) < STREAM_CHUNK:
+            return
+        after = users[-1].id
+
+
+def encode_cursor(user_id: str) -> str:
+    """Opaque cursor token for the page after user_id."""
+    return urlsafe_b64encode(user_id.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    """User ID of a cursor token, None for the first page."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return urlsafe_b64decode(cursor + padding).decode()
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def project(user_json: dict, fields: list) -> dict:
+    """Keep only the requested fields of a User JSON."""
+    if fields is None:
+        return user_json
+    return {k: user_json[k] for k in fields if k in user_json}
+
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def view_one_user(user_id: str = None) -> str:
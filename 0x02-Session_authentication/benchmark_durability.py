@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Benchmark of the save() throughput by STORAGE_DURABILITY: threads
+save new UserSessions into a table of existing ones, as bursty logins
+do
+
+Each mode runs in its own process and temporary directory, the .db
+files of the project are not touched.
+
+Usage:
+    python3 benchmark_durability.py [saves] [threads] [rows] [mode ...]
+"""
+from datetime import datetime
+from os import environ, path
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+def measure(saves: int, threads: int, rows: int):
+    """ Saves UserSessions from threads, in the current directory """
+    from models.base import (STORAGE_DURABILITY, STORAGE_FORMAT,
+                             TIMESTAMP_FORMAT)
+    from models.formats import file_path, write_atomic
+    from models.user_session import UserSession
+
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    objs_json = {}
+    for _ in range(rows):
+        obj_id = str(uuid.uuid4())
+        objs_json[obj_id] = {"id": obj_id, "created_at": now,
+                             "updated_at": now,
+                             "user_id": str(uuid.uuid4()),
+                             "session_id": str(uuid.uuid4())}
+    write_atomic(file_path("UserSession", STORAGE_FORMAT), objs_json,
+                 STORAGE_FORMAT)
+    del objs_json
+    UserSession.load_from_file()
+
+    writes = []
+    save_to_file = UserSession.save_to_file
+
+    def counted_save_to_file():
+        writes.append(None)
+        save_to_file()
+
+    # before the first save, so the flusher writes through it too
+    UserSession.save_to_file = counted_save_to_file
+
+    def worker():
+        for _ in range(saves // threads):
+            UserSession(user_id="u", session_id=str(uuid.uuid4())).save()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    returned = time.perf_counter() - start
+    if STORAGE_DURABILITY != "sync":
+        UserSession._flusher().close()
+    durable = time.perf_counter() - start
+
+    done = saves // threads * threads
+    UserSession.load_from_file()
+    if UserSession.count() != rows + done:
+        raise SystemExit("{} sessions on file".format(UserSession.count()))
+    print("{}: {:.0f} saves/s returned, {:.0f} saves/s durable, "
+          "{} file writes".format(STORAGE_DURABILITY, done / returned,
+                                  done / durable, len(writes)))
+
+
+if __name__ == "__main__":
+    saves = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    if environ.get("BENCHMARK_DURABILITY_CHILD") == "1":
+        measure(saves, threads, rows)
+        sys.exit(0)
+
+    project = path.dirname(path.abspath(__file__))
+    print("{} saves from {} threads, {} existing sessions".format(
+        saves, threads, rows))
+    for mode in sys.argv[4:] or ["sync", "group", "async"]:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(environ, STORAGE_DURABILITY=mode,
+                       BENCHMARK_DURABILITY_CHILD="1", PYTHONPATH=project)
+            subprocess.run([sys.executable, path.abspath(__file__),
+                            str(saves), str(threads), str(rows)],
+                           cwd=directory, env=env, check=True)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+""" Benchmark of the storage formats: load_from_file and save_to_file
+time, file size and peak RSS of User tables, by STORAGE_FORMAT
+
+Each format runs in its own processes and temporary directory, the .db
+files of the project are not touched: one process writes the file, a
+fresh one loads and saves it, so its peak RSS is that of the load and
+the save only.
+
+Usage:
+    python3 benchmark_formats.py [users ...]
+"""
+from datetime import datetime
+from os import environ, path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def peak_rss() -> float:
+    """ Peak RSS of this process, in MB (ru_maxrss is in KiB) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write(size: int):
+    """ Writes a User file of size rows, in the current directory """
+    from models.base import STORAGE_FORMAT, TIMESTAMP_FORMAT
+    from models.formats import file_path, write_atomic
+
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    objs_json = {}
+    for i in range(size):
+        obj_id = str(uuid.uuid4())
+        objs_json[obj_id] = {"id": obj_id, "created_at": now,
+                             "updated_at": now,
+                             "email": "u{}@example.com".format(i),
+                             "_password": "x" * 60,
+                             "first_name": None, "last_name": None}
+    write_atomic(file_path("User", STORAGE_FORMAT), objs_json,
+                 STORAGE_FORMAT)
+
+
+def measure(size: int):
+    """ Loads and saves the User file, in the current directory """
+    from models.base import STORAGE_FORMAT
+    from models.formats import file_path
+    from models.user import User
+
+    db_path = file_path("User", STORAGE_FORMAT)
+    print("{}, {} users, {:.0f} MB file".format(
+        STORAGE_FORMAT.name, size, path.getsize(db_path) / 1e6))
+
+    start = time.perf_counter()
+    User.load_from_file()
+    print("  load_from_file: {:.2f} s, peak RSS {:.0f} MB".format(
+        time.perf_counter() - start, peak_rss()))
+    if User.count() != size:
+        raise SystemExit("{} users loaded".format(User.count()))
+
+    start = time.perf_counter()
+    User.save_to_file()
+    print("  save_to_file: {:.2f} s, peak RSS {:.0f} MB".format(
+        time.perf_counter() - start, peak_rss()))
+
+
+if __name__ == "__main__":
+    child = environ.get("BENCHMARK_FORMATS_CHILD")
+    if child:
+        {"write": write, "measure": measure}[child](int(sys.argv[1]))
+        sys.exit(0)
+
+    from models.formats import FORMATS
+
+    project = path.dirname(path.abspath(__file__))
+    for size in [int(arg) for arg in sys.argv[1:]] or [1000000]:
+        for storage_format in FORMATS:
+            with tempfile.TemporaryDirectory() as directory:
+                for step in ("write", "measure"):
+                    env = dict(environ, STORAGE_FORMAT=storage_format,
+                               BENCHMARK_FORMATS_CHILD=step,
+                               PYTHONPATH=project)
+                    subprocess.run([sys.executable, path.abspath(__file__),
+                                    str(size)],
+                                   cwd=directory, env=env, check=True)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Benchmark of the memory of the models: bytes per User and per
+UserSession, against plain objects with the same attributes in a
+__dict__, as the models were before __slots__
+
+The sizes are the growth of the RSS, so they include the id string and
+both datetimes of each object. Each measure runs in its own process
+and temporary directory, the .db files of the project are not touched.
+
+Usage:
+    python3 benchmark_model_memory.py [objects ...]
+"""
+from os import environ, path
+import resource
+import subprocess
+import sys
+import tempfile
+import uuid
+
+
+KINDS = ("User", "User, __dict__", "UserSession", "UserSession, __dict__")
+
+
+class DictObject():
+    """ Object keeping its attributes in a __dict__ """
+
+    def __init__(self, **kwargs: dict):
+        """ Initialize a DictObject with the attributes of a model,
+        set one by one like the __init__ of the models """
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+def measure(kind: str, count: int):
+    """ Prints the bytes per object of count objects of a kind """
+    from models.base import Base
+    from models.user import User
+    from models.user_session import UserSession
+
+    stamp = "2024-01-01T00:00:00"
+    now = Base().created_at
+    builders = {
+        "User": lambda i: User(
+            id=str(uuid.uuid4()), created_at=stamp, updated_at=stamp,
+            email="u{}@example.com".format(i), _password="x" * 60),
+        "User, __dict__": lambda i: DictObject(
+            id=str(uuid.uuid4()), created_at=now.replace(),
+            updated_at=now.replace(), email="u{}@example.com".format(i),
+            _password="x" * 60, first_name=None, last_name=None),
+        "UserSession": lambda i: UserSession(
+            id=str(uuid.uuid4()), created_at=stamp, updated_at=stamp,
+            user_id=str(i), session_id=str(uuid.uuid4())),
+        "UserSession, __dict__": lambda i: DictObject(
+            id=str(uuid.uuid4()), created_at=now.replace(),
+            updated_at=now.replace(), user_id=str(i),
+            session_id=str(uuid.uuid4())),
+    }
+    build = builders[kind]
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    objs = [build(i) for i in range(count)]
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB; the list itself holds a pointer per object
+    size = (after - before) * 1024 - sys.getsizeof(objs)
+    print("  {}: {:.0f} bytes/object".format(kind, size / count))
+
+
+if __name__ == "__main__":
+    if environ.get("BENCHMARK_MODEL_MEMORY_CHILD") == "1":
+        measure(sys.argv[1], int(sys.argv[2]))
+        sys.exit(0)
+
+    project = path.dirname(path.abspath(__file__))
+    env = dict(environ, BENCHMARK_MODEL_MEMORY_CHILD="1",
+               PYTHONPATH=project)
+    for count in [int(arg) for arg in sys.argv[1:]] or [1000000]:
+        print("{} objects".format(count))
+        for kind in KINDS:
+            with tempfile.TemporaryDirectory() as directory:
+                subprocess.run([sys.executable, path.abspath(__file__),
+                                kind, str(count)],
+                               cwd=directory, env=env, check=True)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+""" Benchmark of the session lookups: session_db_auth vs session_token_auth
+
+Runs in a temporary directory, the .db files of the project are not
+touched.
+
+Usage:
+    python3 benchmark_session_auth.py [lookups]
+"""
+from os import chdir, environ, urandom
+import sys
+import tempfile
+import time
+
+
+def bench(name, auth, session_ids, user_id, lookups):
+    """ Prints the time of a lookup """
+    start = time.perf_counter()
+    for i in range(lookups):
+        if auth.user_id_for_session_id(session_ids[i % 100]) != user_id:
+            raise SystemExit("{}: lookup failed".format(name))
+    elapsed = time.perf_counter() - start
+    print("{}: {:.2f} us per lookup".format(name, elapsed / lookups * 1e6))
+
+
+def main(lookups: int):
+    """ Compares the lookups, in the current directory """
+    # the session store may open its file on import
+    from api.v1.auth.session_db_auth import SessionDBAuth
+    from api.v1.auth.session_token_auth import SessionTokenAuth
+    from models.user import User
+
+    user = User()
+    user.email = "bench@hbtn.io"
+    user.password = "H0lbertonSchool98!"
+    user.save()
+
+    db_auth = SessionDBAuth()
+    session_ids = [db_auth.create_session(user.id) for _ in range(100)]
+    bench("session_db_auth (session store)", db_auth, session_ids,
+          user.id, lookups)
+    # sessions of another worker: not in a "memory" store, found in the
+    # database
+    db_auth.session_store.delete_many(session_ids)
+    bench("session_db_auth (database)", db_auth, session_ids,
+          user.id, lookups)
+
+    token_auth = SessionTokenAuth()
+    bench("session_token_auth", token_auth,
+          [token_auth.create_session(user.id) for _ in range(100)],
+          user.id, lookups)
+
+
+if __name__ == "__main__":
+    environ.setdefault("SESSION_DURATION", "3600")
+    environ.setdefault("SESSION_TOKEN_KEYS", "bench:" + urandom(16).hex())
+    with tempfile.TemporaryDirectory() as directory:
+        chdir(directory)
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+        chdir("/")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Benchmark of the UserSession lookup of SessionDBAuth:
+load_from_file at each request vs reload_if_changed
+
+Runs in a temporary directory, the .db files of the project are not
+touched.
+
+Usage:
+    python3 benchmark_session_reload.py [sessions ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from models.base import STORAGE_FORMAT, TIMESTAMP_FORMAT
+from models.formats import file_path, write_atomic
+from models.user_session import UserSession
+
+
+def bench(name, lookup, session_id, repeat):
+    """ Prints the time of a lookup """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if not lookup(session_id):
+            raise SystemExit("{}: lookup failed".format(name))
+    elapsed = time.perf_counter() - start
+    print("  {}: {:.3f} ms per lookup".format(name,
+                                              elapsed / repeat * 1000))
+
+
+def reload_lookup(session_id):
+    """ Lookup of SessionDBAuth before reload_if_changed """
+    UserSession.load_from_file()
+    return UserSession.search({'session_id': session_id})
+
+
+def cached_lookup(session_id):
+    """ Lookup of SessionDBAuth """
+    UserSession.reload_if_changed()
+    return UserSession.search({'session_id': session_id})
+
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+
+with tempfile.TemporaryDirectory() as directory:
+    os.chdir(directory)
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    for size in sizes:
+        objs_json = {}
+        for _ in range(size):
+            obj_id = str(uuid.uuid4())
+            objs_json[obj_id] = {"id": obj_id, "created_at": now,
+                                 "updated_at": now,
+                                 "user_id": str(uuid.uuid4()),
+                                 "session_id": str(uuid.uuid4())}
+        session_id = objs_json[obj_id]["session_id"]
+        write_atomic(file_path("UserSession", STORAGE_FORMAT), objs_json,
+                     STORAGE_FORMAT)
+        del objs_json
+        UserSession.load_from_file()
+
+        print("{} sessions".format(size))
+        bench("load_from_file", reload_lookup, session_id,
+              max(1, 100000 // size))
+        bench("reload_if_changed", cached_lookup, session_id, 1000)
+    os.chdir("/")
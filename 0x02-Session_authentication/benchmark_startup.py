@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Benchmark of the startup: User.load_from_file of a .db_User.json of
+1M rows, with the fromisoformat fast path and with strptime for every
+timestamp as before
+
+Runs in a temporary directory, the .db files of the project are not
+touched.
+
+Usage:
+    python3 benchmark_startup.py [users ...]
+"""
+from datetime import datetime
+from os import chdir
+import sys
+import tempfile
+import time
+import uuid
+
+
+def bench(name, function):
+    """ Prints the time of a call """
+    start = time.perf_counter()
+    function()
+    print("  {}: {:.2f} s".format(name, time.perf_counter() - start))
+
+
+def main(sizes):
+    """ Writes and loads the users, in the current directory """
+    from models import base
+    from models.base import STORAGE_FORMAT, TIMESTAMP_FORMAT
+    from models.formats import file_path, read, write_atomic
+    from models.user import User
+
+    fast_parse = base._parse_timestamp
+
+    def strptime_parse(value):
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+    def load_strptime():
+        base._parse_timestamp = strptime_parse
+        try:
+            User.load_from_file()
+        finally:
+            base._parse_timestamp = fast_parse
+
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    db_path = file_path("User", STORAGE_FORMAT)
+    for size in sizes:
+        objs_json = {}
+        for i in range(size):
+            obj_id = str(uuid.uuid4())
+            objs_json[obj_id] = {"id": obj_id, "created_at": now,
+                                 "updated_at": now,
+                                 "email": "u{}@example.com".format(i),
+                                 "_password": "x" * 60,
+                                 "first_name": None, "last_name": None}
+        write_atomic(db_path, objs_json, STORAGE_FORMAT)
+        del objs_json
+
+        print("{} users".format(size))
+        bench("read file", lambda: read(db_path, STORAGE_FORMAT))
+        bench("load_from_file, strptime", load_strptime)
+        bench("load_from_file", User.load_from_file)
+        if User.count() != size:
+            raise SystemExit("{} users loaded".format(User.count()))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000000]
+    with tempfile.TemporaryDirectory() as directory:
+        chdir(directory)
+        main(sizes)
+        chdir("/")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+""" Benchmark of Base.to_json: objects per second of to_json() and
+to_json(True), without and with MODEL_JSON_CACHE
+
+Each setting runs in its own process and temporary directory, the .db
+files of the project are not touched.
+
+Usage:
+    python3 benchmark_to_json.py [objects] [rounds]
+"""
+from os import environ, path
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def bench(name, function, objs, rounds):
+    """ Prints the objects per second of a function """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for obj in objs:
+            function(obj)
+    elapsed = time.perf_counter() - start
+    print("  {}: {:.0f} objects/s".format(name,
+                                          len(objs) * rounds / elapsed))
+
+
+def main(count: int, rounds: int):
+    """ Serializes count users, as loaded from file, rounds times """
+    from models.base import JSON_CACHE
+    from models.user import User
+
+    users = [User(id=str(i), created_at="2024-01-01T00:00:00",
+                  updated_at="2024-01-02T00:00:00",
+                  email="u{}@example.com".format(i), _password="x" * 60,
+                  first_name="First", last_name="Last")
+             for i in range(count)]
+    print("MODEL_JSON_CACHE={}, {} users".format(int(JSON_CACHE), count))
+    bench("to_json()", User.to_json, users, rounds)
+    bench("to_json(True)", lambda user: user.to_json(True), users, rounds)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    if environ.get("BENCHMARK_TO_JSON_CHILD") == "1":
+        main(count, rounds)
+        sys.exit(0)
+
+    project = path.dirname(path.abspath(__file__))
+    for cache in ("0", "1"):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(environ, MODEL_JSON_CACHE=cache,
+                       BENCHMARK_TO_JSON_CHILD="1", PYTHONPATH=project)
+            subprocess.run([sys.executable, path.abspath(__file__),
+                            str(count), str(rounds)],
+                           cwd=directory, env=env, check=True)
@@ -1,37 +1,84 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from operator import attrgetter
 from typing import TypeVar, List, Iterable
-from os import path
-import json
+from os import getenv, path, stat
+from threading import RLock
+from models.flusher import Flusher
+from models.formats import FORMATS, file_path, read, write_atomic
+from models.journal import Journal
+from models.lazy_table import LazyTable
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_KEYS = {}
+ORDERED_IDS = {}
+SERIALIZERS = {}
+SLOTS = {}
+JOURNALS = {}
+SIGNATURES = {}
+LOCKS = {}
+WRITE_LOCKS = {}
+GENERATIONS = {}
+WRITTEN = {}
+FLUSHERS = {}
+
+STORAGE_MODE = getenv("STORAGE_MODE", "file")
+STORAGE_COMPACT_EVERY = int(getenv("STORAGE_COMPACT_EVERY", "1000"))
+JSON_CACHE = getenv("MODEL_JSON_CACHE", "0") == "1"
+STORAGE_FORMAT = FORMATS[getenv("STORAGE_FORMAT", "json")]
+STORAGE_DURABILITY = getenv("STORAGE_DURABILITY", "sync")
+STORAGE_FLUSH_INTERVAL = float(getenv("STORAGE_FLUSH_INTERVAL", "0.01"))
+STORAGE_FLUSH_BATCH = int(getenv("STORAGE_FLUSH_BATCH", "100"))
 
 
 class Base():
     """ Base class
+
+    Models declare their attributes in __slots__ so that the millions
+    of objects held in DATA carry no per-instance __dict__
+
+    Writers of a class (save, remove, load_from_file) are serialized
+    by its lock and replace or mutate DATA with single dict operations;
+    readers (get, search, count, page) never lock and iterate over
+    snapshots of DATA
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at', '_json_cache')
+
+    # attributes with a secondary index for search(); an object is
+    # indexed by their values at its last save(), so a new value set
+    # without save() is not found by a search on that attribute
+    INDEXED_ATTRIBUTES = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            with self.__class__._lock():
+                if DATA.get(s_class) is None:
+                    self.__class__._reset_indexes()
+                    if STORAGE_MODE == "lazy":
+                        # objects already on disk stay there
+                        self.__class__._open_lazy()
+                    else:
+                        DATA[s_class] = {}
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self._json_cache = None
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = _parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = _parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -46,60 +93,334 @@ class Base():
 
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
+
+        With MODEL_JSON_CACHE=1 the result is kept until the next save(),
+        so attributes changed without saving are not reflected
         """
+        cache = self._json_cache
+        if cache is not None and for_serialization in cache:
+            return dict(cache[for_serialization])
+
+        cls = self.__class__
+        keys = cls._slot_names()
+        if cls.__dictoffset__:
+            keys = keys + tuple(self.__dict__)
+        fields, getter = cls._serializer(keys, for_serialization)
+        try:
+            values = getter(self)
+        except AttributeError:
+            values = tuple(getattr(self, key, _UNSET) for key in fields)
+
         result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
+        for key, value in zip(fields, values):
+            if value is _UNSET:
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = _timestamp(value)
             else:
                 result[key] = value
+
+        if JSON_CACHE:
+            if cache is None:
+                cache = self._json_cache = {}
+            cache[for_serialization] = dict(result)
         return result
 
+    @classmethod
+    def _slot_names(cls) -> tuple:
+        """ Attributes declared in the __slots__ of the class hierarchy
+        """
+        names = SLOTS.get(cls)
+        if names is None:
+            names = tuple(name for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ())
+                          if name not in ('__dict__', '__weakref__'))
+            SLOTS[cls] = names
+        return names
+
+    @classmethod
+    def _serializer(cls, keys: tuple, for_serialization: bool) -> tuple:
+        """ Attributes written by to_json and a getter of their values,
+        compiled once per class and attribute layout
+        """
+        serializer = SERIALIZERS.get((cls, keys, for_serialization))
+        if serializer is None:
+            fields = tuple(key for key in keys
+                           if key != '_json_cache' and
+                           (for_serialization or key[0] != '_'))
+            if len(fields) > 1:
+                getter = attrgetter(*fields)
+            else:
+                def getter(obj):
+                    return tuple(getattr(obj, key) for key in fields)
+            serializer = (fields, getter)
+            SERIALIZERS[(cls, keys, for_serialization)] = serializer
+        return serializer
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        db_path = file_path(s_class, STORAGE_FORMAT)
+        with cls._lock():
+            SIGNATURES[s_class] = cls._signature()
+            if STORAGE_MODE == "lazy":
+                cls._reset_indexes()
+                cls._open_lazy()
+                return
+            if STORAGE_MODE == "journal":
+                objs_json = cls._journal().replay()
+            elif not path.exists(db_path):
+                objs_json = {}
+            else:
+                objs_json = read(db_path, STORAGE_FORMAT)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
+            objs = {}
+            indexes = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+            indexed_keys = {}
             for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+                obj = cls(**obj_json)
+                objs[obj_id] = obj
+                cls._index(obj, indexes, indexed_keys)
+            # readers keep using the previous objects until the swap
+            INDEXES[s_class] = indexes
+            INDEXED_KEYS[s_class] = indexed_keys
+            ORDERED_IDS[s_class] = sorted(objs)
+            DATA[s_class] = objs
+
+    @classmethod
+    def _open_lazy(cls):
+        """ Map the .lazy file of the class, in "lazy" storage mode,
+        creating it from the STORAGE_FORMAT file on first use
+        """
+        s_class = cls.__name__
+        lazy_path = ".db_{}.lazy".format(s_class)
+        db_path = file_path(s_class, STORAGE_FORMAT)
+        if not path.exists(lazy_path) and path.exists(db_path):
+            LazyTable.create(cls, lazy_path, read(db_path, STORAGE_FORMAT))
+        DATA[s_class] = LazyTable(cls, lazy_path)
+        # built on the first page() call, it needs every ID
+        ORDERED_IDS[s_class] = None
+        SIGNATURES[s_class] = cls._signature()
+
+    @classmethod
+    def reload_if_changed(cls):
+        """ Load all objects from file, unless the files did not
+        change since this process last loaded or wrote them, or this
+        process has saves not written yet (its next write wins anyway)
+        """
+        s_class = cls.__name__
+        if DATA.get(s_class) is not None and \
+                SIGNATURES.get(s_class) == cls._signature():
+            return
+        write_lock = cls._write_lock()
+        if not write_lock.acquire(blocking=False):
+            # this process is writing the file: its objects are newer
+            return
+        try:
+            with cls._lock():
+                if DATA.get(s_class) is not None and \
+                        (SIGNATURES.get(s_class) == cls._signature() or
+                         GENERATIONS.get(s_class, 0) >
+                         WRITTEN.get(s_class, 0)):
+                    return
+                cls.load_from_file()
+        finally:
+            write_lock.release()
+
+    @classmethod
+    def _signature(cls) -> tuple:
+        """ (inode, mtime, size) of the files backing the class
+        """
+        s_class = cls.__name__
+        db_paths = [file_path(s_class, STORAGE_FORMAT)]
+        if STORAGE_MODE == "lazy":
+            db_paths = [".db_{}.lazy".format(s_class)]
+        if STORAGE_MODE == "journal":
+            db_paths.append(".db_{}.journal".format(s_class))
+        signature = []
+        for db_path in db_paths:
+            try:
+                st = stat(db_path)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
+        with cls._write_lock():
+            # every mutation up to this generation is in the dump below
+            generation = GENERATIONS.get(s_class, 0)
+            if STORAGE_MODE == "journal":
+                cls._journal().compact(cls._dump)
+            elif STORAGE_MODE == "lazy":
+                with cls._lock():
+                    if not isinstance(DATA.get(s_class), LazyTable):
+                        # never re-create the file: it may hold objects
+                        cls._reset_indexes()
+                        cls._open_lazy()
+                    DATA[s_class].save()
+            else:
+                write_atomic(file_path(s_class, STORAGE_FORMAT), cls._dump(),
+                             STORAGE_FORMAT)
+            WRITTEN[s_class] = generation
+            SIGNATURES[s_class] = cls._signature()
+
+    @classmethod
+    def _flush(cls, generation: int):
+        """ Make the mutation `generation` durable, by STORAGE_DURABILITY:
+          - "sync": write the file, unless a write that started after
+            the mutation already did (concurrent saves queue on the
+            write lock and the first one writes for all of them)
+          - "group": wait for the next write of the class flusher
+          - "async": leave it to the class flusher
+        """
+        if generation is None:
+            return
+        if STORAGE_DURABILITY != "sync":
+            flusher = cls._flusher()
+            flusher.mark(generation)
+            if STORAGE_DURABILITY == "group":
+                flusher.wait(generation)
+            return
+        with cls._write_lock():
+            if WRITTEN.get(cls.__name__, 0) >= generation:
+                return
+            cls.save_to_file()
+
+    @classmethod
+    def _flusher(cls) -> Flusher:
+        """ Write-behind flusher of the class
+        """
+        s_class = cls.__name__
+        if FLUSHERS.get(s_class) is None:
+            with cls._lock():
+                if FLUSHERS.get(s_class) is None:
+                    FLUSHERS[s_class] = Flusher(cls.save_to_file,
+                                                STORAGE_FLUSH_INTERVAL,
+                                                STORAGE_FLUSH_BATCH)
+        return FLUSHERS[s_class]
+
+    @classmethod
+    def _dump(cls) -> dict:
+        """ Serialize all objects of the class
+        """
+        s_class = cls.__name__
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
+        # tuple() copies the items atomically, the journal compacts
+        # from a background thread while requests keep saving
+        for obj_id, obj in tuple(DATA[s_class].items()):
             objs_json[obj_id] = obj.to_json(True)
+        return objs_json
+
+    @classmethod
+    def _journal(cls) -> Journal:
+        """ Journal of the class, in "journal" storage mode
+        """
+        s_class = cls.__name__
+        if JOURNALS.get(s_class) is None:
+            JOURNALS[s_class] = Journal(file_path(s_class, STORAGE_FORMAT),
+                                        ".db_{}.journal".format(s_class),
+                                        STORAGE_COMPACT_EVERY,
+                                        STORAGE_FORMAT)
+        return JOURNALS[s_class]
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _persist(cls, record: dict) -> int:
+        """ Persist one mutation, under the lock of the class: append
+        it to the journal, or number it for the next file write; returns
+        the generation to _flush() once the lock is released
+        """
+        s_class = cls.__name__
+        if STORAGE_MODE != "journal":
+            GENERATIONS[s_class] = GENERATIONS.get(s_class, 0) + 1
+            return GENERATIONS[s_class]
+        if cls._journal().append(record):
+            cls._journal().compact_in_background(cls._dump)
+        SIGNATURES[s_class] = cls._signature()
+        return None
+
+    @classmethod
+    def _lock(cls) -> RLock:
+        """ Lock serializing the writers of the objects of the class
+        """
+        return _class_lock(LOCKS, cls.__name__)
+
+    @classmethod
+    def _write_lock(cls) -> RLock:
+        """ Lock serializing the file writes of the class
+        """
+        return _class_lock(WRITE_LOCKS, cls.__name__)
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__._lock():
+            self.updated_at = datetime.utcnow()
+            self._json_cache = None
+            DATA[s_class][self.id] = self
+            self.__class__._index(self)
+            self.__class__._order(self.id)
+            generation = self.__class__._persist(
+                {'op': 'save', 'obj': self.to_json(True)})
+        self.__class__._flush(generation)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with self.__class__._lock():
+            if DATA[s_class].get(self.id) is None:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self.__class__._unindex(self.id)
+            self.__class__._unorder(self.id)
+            generation = self.__class__._persist(
+                {'op': 'remove', 'id': self.id})
+        self.__class__._flush(generation)
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')]) -> None:
+        """ Save objects as they are (updated_at included), with a
+        single file write
+        """
+        s_class = cls.__name__
+        generation = None
+        with cls._lock():
+            for obj in objs:
+                obj._json_cache = None
+                DATA[s_class][obj.id] = obj
+                cls._index(obj)
+                cls._order(obj.id)
+                generation = cls._persist(
+                    {'op': 'save', 'obj': obj.to_json(True)})
+        cls._flush(generation)
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """ Remove objects, persisting them with a single file write
+        """
+        s_class = cls.__name__
+        removed = 0
+        generation = None
+        with cls._lock():
+            for obj in objs:
+                if DATA[s_class].get(obj.id) is None:
+                    continue
+                del DATA[s_class][obj.id]
+                cls._unindex(obj.id)
+                cls._unorder(obj.id)
+                generation = cls._persist({'op': 'remove', 'id': obj.id})
+                removed += 1
+        cls._flush(generation)
+        return removed
 
     @classmethod
     def count(cls) -> int:
@@ -121,11 +442,35 @@ class Base():
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by ID, starting after
+        the ID `after` (keyset pagination)
+        """
+        s_class = cls.__name__
+        if ORDERED_IDS[s_class] is None:
+            ORDERED_IDS[s_class] = sorted(DATA[s_class])
+        ids = ORDERED_IDS[s_class]
+        start = 0 if after is None else bisect_right(ids, after)
+        end = len(ids) if limit is None else start + limit
+        objs = DATA[s_class]
+        return [objs[obj_id] for obj_id in ids[start:end] if obj_id in objs]
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Attributes of INDEXED_ATTRIBUTES are matched as of the last
+        save() of each object: an unsaved change of one of them is only
+        seen by searches on other attributes
         """
         s_class = cls.__name__
+        objs = DATA[s_class]
+        candidates = cls._candidates(attributes)
+        if candidates is not None:
+            objs = candidates
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +478,153 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        # tuple() snapshots a dict in one step, writers may be adding
+        # or removing objects meanwhile
+        return list(filter(_search, tuple(objs.values())))
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Drop the secondary indexes of the class
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        INDEXED_KEYS[s_class] = {}
+        ORDERED_IDS[s_class] = []
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base'), indexes: dict = None,
+               indexed_keys: dict = None):
+        """ Add (or move) an object in the secondary indexes, or in
+        indexes being built
+        """
+        if len(cls.INDEXED_ATTRIBUTES) == 0:
+            return
+        s_class = cls.__name__
+        if indexes is None:
+            indexes = INDEXES[s_class]
+            indexed_keys = INDEXED_KEYS[s_class]
+        keys = {attr: _index_key(getattr(obj, attr, None))
+                for attr in cls.INDEXED_ATTRIBUTES}
+        if indexed_keys.get(obj.id) == keys:
+            for attr, key in keys.items():
+                indexes[attr][key][obj.id] = obj
+            return
+        cls._unindex(obj.id, indexes, indexed_keys)
+        for attr, key in keys.items():
+            indexes[attr].setdefault(key, {})[obj.id] = obj
+        indexed_keys[obj.id] = keys
+
+    @classmethod
+    def _order(cls, obj_id: str):
+        """ Add an ID to the ordered ID index
+        """
+        ids = ORDERED_IDS[cls.__name__]
+        if ids is None:
+            return
+        i = bisect_left(ids, obj_id)
+        if i == len(ids) or ids[i] != obj_id:
+            ids.insert(i, obj_id)
+
+    @classmethod
+    def _unorder(cls, obj_id: str):
+        """ Remove an ID from the ordered ID index
+        """
+        ids = ORDERED_IDS[cls.__name__]
+        if ids is None:
+            return
+        i = bisect_left(ids, obj_id)
+        if i < len(ids) and ids[i] == obj_id:
+            del ids[i]
+
+    @classmethod
+    def _unindex(cls, obj_id: str, indexes: dict = None,
+                 indexed_keys: dict = None):
+        """ Remove an object from the secondary indexes, or from
+        indexes being built
+        """
+        s_class = cls.__name__
+        if indexes is None:
+            indexes = INDEXES.get(s_class, {})
+            indexed_keys = INDEXED_KEYS.get(s_class, {})
+        keys = indexed_keys.pop(obj_id, None)
+        if keys is None:
+            return
+        for attr, key in keys.items():
+            bucket = indexes[attr].get(key)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 0:
+                indexes[attr].pop(key, None)
+
+    @classmethod
+    def _candidates(cls, attributes: dict) -> dict:
+        """ Return the objects that may match the attributes, using
+        the narrowest secondary index hit, or None if no index applies
+
+        In "lazy" storage mode the index only holds the objects saved
+        since the file was mapped, the file index gives the others
+        """
+        s_class = cls.__name__
+        table = DATA[s_class]
+        best = None
+        for attr, value in attributes.items():
+            index = INDEXES.get(s_class, {}).get(attr)
+            if index is None:
+                continue
+            bucket = index.get(_index_key(value), {})
+            unhashable = index.get(_UNHASHABLE)
+            if unhashable:
+                bucket = {**bucket, **unhashable}
+            if isinstance(table, LazyTable):
+                bucket = {**table.lookup(attr, value), **bucket}
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        return best
+
+
+_UNHASHABLE = object()
+_UNSET = object()
+
+
+def _class_lock(locks: dict, s_class: str) -> RLock:
+    """ Lock of a class in a dict of locks, created on first use
+    """
+    lock = locks.get(s_class)
+    if lock is None:
+        lock = locks.setdefault(s_class, RLock())
+    return lock
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+
+    datetime.fromisoformat is a C fast path for exactly this layout,
+    anything else goes through strptime (and fails like it did)
+    """
+    if type(value) is str and len(value) == 19 and value[10] == 'T' \
+            and value[4] == value[7] == '-' and value[13] == value[16] == ':':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _timestamp(value: datetime) -> str:
+    """ Format a datetime as TIMESTAMP_FORMAT
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(timespec='seconds')
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _index_key(value):
+    """ Key of a value in a secondary index
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+""" Flusher module
+"""
+from typing import Callable
+import atexit
+import threading
+import time
+
+
+class Flusher():
+    """ Write-behind writer of one class
+
+    Saves mark their generation dirty; a background thread waits for
+    `batch` marks or `interval` seconds after the first one, then
+    writes once for all of them. "group" durability waits for that
+    write (save() is durable when it returns, the fsync is shared),
+    "async" durability returns at once and the last marks are written
+    at exit.
+    """
+
+    def __init__(self, write: Callable[[], None], interval: float = 0.01,
+                 batch: int = 100):
+        """ Initialize a Flusher
+        """
+        self.write = write
+        self.interval = interval
+        self.batch = batch
+        self.writes = 0
+        self._requested = 0
+        self._written = 0
+        self._pending = 0
+        self._first_pending = None
+        self._error = None
+        self._thread = None
+        self._cond = threading.Condition()
+        atexit.register(self.close)
+
+    def mark(self, generation: int):
+        """ Schedule a write covering a mutation
+        """
+        with self._cond:
+            self._requested = max(self._requested, generation)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            if self._first_pending is None:
+                # starts the interval
+                self._first_pending = time.monotonic()
+                self._cond.notify_all()
+            elif self._pending >= self.batch:
+                self._cond.notify_all()
+
+    def wait(self, generation: int):
+        """ Block until a write covered a mutation, raise the error
+        of the write that should have
+        """
+        with self._cond:
+            while self._written < generation:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+
+    def close(self):
+        """ Write what is pending
+        """
+        with self._cond:
+            pending = self._requested
+        self.wait(pending)
+
+    def _run(self):
+        """ Write whenever a batch is full or its interval elapsed
+        """
+        while True:
+            with self._cond:
+                while self._requested <= self._written:
+                    self._cond.wait()
+                while self._pending < self.batch:
+                    left = self._first_pending + self.interval - \
+                        time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                target = self._requested
+                self._pending = 0
+                self._first_pending = None
+                self._error = None
+            try:
+                # the write dumps every mutation done so far, at least
+                # up to target
+                self.write()
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    if self._first_pending is None:
+                        # retry after an interval, even without new marks
+                        self._first_pending = time.monotonic()
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._written = max(self._written, target)
+                self.writes += 1
+                self._cond.notify_all()
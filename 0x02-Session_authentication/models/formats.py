@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+""" On-disk formats of the .db_<Class> files
+
+Usage to convert a file between formats:
+    python3 -m models.formats <Class> <from format> <to format>
+"""
+from array import array
+from os import path
+import json
+import os
+import struct
+import sys
+
+
+class JSONFormat():
+    """ One JSON object {id: {attribute: value}} per class
+    """
+
+    name = "json"
+    extension = "json"
+    binary = False
+
+    def dump(self, objs_json: dict, f):
+        """ Write the objects JSON to a file
+        """
+        json.dump(objs_json, f)
+
+    def load(self, f) -> dict:
+        """ Read the objects JSON from a file
+        """
+        return json.load(f)
+
+
+class ColumnarFormat():
+    """ Binary column-oriented layout, little-endian:
+      - header: MAGIC, version (uint16), rows (uint32), columns (uint32)
+      - the ids, as a string section
+      - per column: its name (uint32 length + UTF-8), its kind (uint8,
+        KIND_STRING or KIND_JSON), its values as a string section, then
+        its null rows and its missing rows (uint32 count + uint32 rows)
+    A string section is the offset width (uint8, 4 or 8), the blob
+    length (uint64), the blob (each value in UTF-8 followed by a NUL)
+    and rows + 1 offsets into the blob, so a mapped file can read any
+    value. Columns whose values are not all strings (or null) hold
+    their values as JSON text. Column names are stored once instead of
+    once per row, and the file is written a column at a time
+    """
+
+    name = "columnar"
+    extension = "col"
+    binary = True
+    version = 2
+
+    MAGIC = b"DBCOL\n"
+    HEADER = struct.Struct("<HII")
+    KIND_STRING = 0
+    KIND_JSON = 1
+    CHUNK = 1 << 16
+    # lone surrogates are valid in JSON strings: they are kept, encoded
+    # as UTF-8 would encode them
+    ERRORS = "surrogatepass"
+
+    def dump(self, objs_json: dict, f):
+        """ Write the objects JSON to a file
+        """
+        columns = {}
+        for obj_json in objs_json.values():
+            for key in obj_json:
+                columns.setdefault(key, None)
+        f.write(self.MAGIC)
+        f.write(self.HEADER.pack(self.version, len(objs_json),
+                                 len(columns)))
+        self._dump_strings(list(objs_json), f)
+
+        for column in columns:
+            values = []
+            missing = array('I')
+            for row, obj_json in enumerate(objs_json.values()):
+                if column in obj_json:
+                    values.append(obj_json[column])
+                else:
+                    values.append(None)
+                    missing.append(row)
+            kind = self.KIND_STRING
+            if not all(v is None or isinstance(v, str) for v in values):
+                kind = self.KIND_JSON
+                values = [json.dumps(v) for v in values]
+            nulls = array('I', (row for row, v in enumerate(values)
+                                if v is None))
+
+            name = column.encode("utf-8", self.ERRORS)
+            f.write(struct.pack("<I", len(name)) + name)
+            f.write(struct.pack("<B", kind))
+            self._dump_strings(values, f)
+            for rows in (nulls, missing):
+                f.write(struct.pack("<I", len(rows)))
+                self._dump_array(rows, f)
+
+    def load(self, f) -> dict:
+        """ Read the objects JSON from a file
+        """
+        reader = _Reader(f.read())
+        if reader.take(len(self.MAGIC)) != self.MAGIC:
+            raise ValueError("not a columnar file")
+        version, rows, column_count = reader.unpack(self.HEADER)
+        if version != self.version:
+            raise ValueError("unsupported columnar version: {}"
+                             .format(version))
+        ids = self._load_strings(reader, rows)
+
+        columns = []
+        values = []
+        missing = {}
+        for _ in range(column_count):
+            name = bytes(reader.take(reader.unpack_one("<I"))).decode(
+                "utf-8", self.ERRORS)
+            kind = reader.unpack_one("<B")
+            column = self._load_strings(reader, rows)
+            nulls = self._load_array(reader, 'I', reader.unpack_one("<I"))
+            absent = self._load_array(reader, 'I', reader.unpack_one("<I"))
+            try:
+                if kind == self.KIND_JSON and not nulls:
+                    column = [json.loads(v) for v in column]
+                elif kind == self.KIND_STRING:
+                    for row in nulls:
+                        column[row] = None
+                else:
+                    raise ValueError("bad column {}".format(name))
+                columns.append(name)
+                values.append(column)
+                if absent:
+                    missing[name] = [ids[row] for row in absent]
+            except IndexError:
+                raise ValueError("row out of range in column {}"
+                                 .format(name))
+        if reader.remaining():
+            raise ValueError("trailing data in columnar file")
+
+        objs_json = {obj_id: dict(zip(columns, row))
+                     for obj_id, row in zip(ids, zip(*values))}
+        for column, obj_ids in missing.items():
+            for obj_id in obj_ids:
+                del objs_json[obj_id][column]
+        return objs_json
+
+    @classmethod
+    def _dump_strings(cls, values: list, f):
+        """ Write a string section, None written as an empty string
+        """
+        offsets = array('Q', [0])
+        position = 0
+        for v in values:
+            if v:
+                position += len(v) if v.isascii() else \
+                    len(v.encode("utf-8", cls.ERRORS))
+            position += 1
+            offsets.append(position)
+        if position < 1 << 32:
+            offsets = array('I', offsets)
+        f.write(struct.pack("<BQ", offsets.itemsize, position))
+        # encoded a chunk at a time, not as one more copy of the column
+        for start in range(0, len(values), cls.CHUNK):
+            chunk = values[start:start + cls.CHUNK]
+            f.write(("\0".join([v or "" for v in chunk]) + "\0").encode(
+                "utf-8", cls.ERRORS))
+        cls._dump_array(offsets, f)
+
+    @staticmethod
+    def _dump_array(values: array, f):
+        """ Write an array, little-endian
+        """
+        if sys.byteorder != "little":
+            values = array(values.typecode, values)
+            values.byteswap()
+        f.write(values.tobytes())
+
+    @classmethod
+    def _load_strings(cls, reader, rows: int) -> list:
+        """ Read a string section of rows values
+        """
+        width, length = reader.unpack(struct.Struct("<BQ"))
+        if width not in (4, 8):
+            raise ValueError("bad offset width: {}".format(width))
+        blob = bytes(reader.take(length))
+        offsets_data = reader.take(width * (rows + 1))
+        values = blob.decode("utf-8", cls.ERRORS).split("\0")
+        if len(values) == rows + 1 and values[-1] == "":
+            # no value holds a NUL: the terminators split the values
+            values.pop()
+            return values
+        offsets = cls._load_array(_Reader(offsets_data),
+                                  'I' if width == 4 else 'Q', rows + 1)
+        return [blob[offsets[row]:offsets[row + 1] - 1].decode(
+                    "utf-8", cls.ERRORS)
+                for row in range(rows)]
+
+    @staticmethod
+    def _load_array(reader, typecode: str, count: int) -> array:
+        """ Read a little-endian array of count items
+        """
+        values = array(typecode)
+        values.frombytes(reader.take(values.itemsize * count))
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+
+class _Reader():
+    """ Bounds-checked cursor over the bytes of a file
+    """
+
+    def __init__(self, data: bytes):
+        """ Initialize a _Reader
+        """
+        self.data = memoryview(data)
+        self.position = 0
+
+    def take(self, size: int) -> memoryview:
+        """ The next size bytes, ValueError if the file is truncated
+        """
+        end = self.position + size
+        if size < 0 or end > len(self.data):
+            raise ValueError("truncated columnar file")
+        chunk = self.data[self.position:end]
+        self.position = end
+        return chunk
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        """ The next fields of a layout
+        """
+        return layout.unpack(self.take(layout.size))
+
+    def unpack_one(self, layout: str):
+        """ The next field of a one-field layout
+        """
+        return self.unpack(struct.Struct(layout))[0]
+
+    def remaining(self) -> int:
+        """ Number of bytes left
+        """
+        return len(self.data) - self.position
+
+
+FORMATS = {f.name: f for f in (JSONFormat(), ColumnarFormat())}
+
+
+def file_path(s_class: str, storage_format) -> str:
+    """ Path of the .db file of a class in a format
+    """
+    return ".db_{}.{}".format(s_class, storage_format.extension)
+
+
+def read(file_path: str, storage_format) -> dict:
+    """ Read a .db file
+    """
+    with open(file_path, 'rb' if storage_format.binary else 'r') as f:
+        return storage_format.load(f)
+
+
+def write_atomic(file_path: str, objs_json: dict, storage_format):
+    """ Write a .db file so that readers see either the old
+    or the new content, never a partial one
+    """
+    tmp_path = "{}.tmp".format(file_path)
+    try:
+        with open(tmp_path, 'wb' if storage_format.binary else 'w') as f:
+            storage_format.dump(objs_json, f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, file_path)
+    fsync_dir(file_path)
+
+
+def fsync_dir(file_path: str):
+    """ Make a rename/unlink in the directory of file_path durable
+    """
+    try:
+        fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def convert(s_class: str, source: str, target: str):
+    """ Convert the .db file of a class from one format to another
+    """
+    source_format = FORMATS[source]
+    target_format = FORMATS[target]
+    objs_json = read(file_path(s_class, source_format), source_format)
+    write_atomic(file_path(s_class, target_format), objs_json, target_format)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[2] not in FORMATS \
+            or sys.argv[3] not in FORMATS:
+        print("Usage: python3 -m models.formats <Class> <{}> <{}>"
+              .format("|".join(FORMATS), "|".join(FORMATS)))
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+""" Journal module
+"""
+from glob import escape, glob
+from models.formats import FORMATS, fsync_dir, read, write_atomic
+from os import path
+from typing import Callable
+import json
+import os
+import threading
+import time
+
+
+class Journal():
+    """ Append-only log of the mutations of one class
+
+    Each mutation is one JSON line:
+      - {"op": "save", "obj": {...}}
+      - {"op": "remove", "id": "..."}
+    Compaction rotates the active journal to `<journal>.<n>`, writes
+    a snapshot atomically and only then deletes the rotated journals,
+    so a crash at any point is recovered by replaying
+    snapshot + rotated journals + active journal.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str,
+                 compact_every: int = 1000, storage_format=FORMATS["json"]):
+        """ Initialize a Journal
+        """
+        self.snapshot_path = snapshot_path
+        self.storage_format = storage_format
+        self.path = journal_path
+        self.compact_every = compact_every
+        self.records = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compacting = False
+
+    def append(self, record: dict) -> bool:
+        """ Durably append one record, return True when the journal
+        is due for compaction
+        """
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records += 1
+            return self.records >= self.compact_every
+
+    def replay(self) -> dict:
+        """ Rebuild the objects JSON from snapshot and journals
+        """
+        objs_json = {}
+        if path.exists(self.snapshot_path):
+            objs_json = read(self.snapshot_path, self.storage_format)
+        with self._lock:
+            for journal_path in self._rotated():
+                self._apply(journal_path, objs_json)
+            self.records = self._apply(self.path, objs_json, True)
+        return objs_json
+
+    def compact(self, dump: Callable[[], dict]):
+        """ Write a snapshot of dump() and drop the journals it covers
+        """
+        with self._compact_lock:
+            # rotate first: every record of the rotated journals was
+            # applied in memory before dump() runs
+            rotated = self._rotate()
+            objs_json = dump()
+            write_atomic(self.snapshot_path, objs_json, self.storage_format)
+            for journal_path in self._rotated():
+                if self._sequence(journal_path) <= rotated:
+                    os.remove(journal_path)
+            fsync_dir(self.path)
+
+    def compact_in_background(self, dump: Callable[[], dict]):
+        """ Start a compaction thread unless one is already running
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def _run():
+            try:
+                self.compact(dump)
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    def _rotate(self) -> int:
+        """ Move the active journal aside, return its sequence number
+        """
+        sequence = time.time_ns()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if path.exists(self.path):
+                os.replace(self.path, "{}.{}".format(self.path, sequence))
+            self.records = 0
+        return sequence
+
+    def _rotated(self) -> list:
+        """ Rotated journals, oldest first
+        """
+        rotated = [p for p in glob("{}.*".format(escape(self.path)))
+                   if self._sequence(p) is not None]
+        return sorted(rotated, key=self._sequence)
+
+    def _sequence(self, journal_path: str) -> int:
+        """ Sequence number of a rotated journal
+        """
+        suffix = journal_path[len(self.path) + 1:]
+        return int(suffix) if suffix.isdigit() else None
+
+    @staticmethod
+    def _apply(journal_path: str, objs_json: dict,
+               repair: bool = False) -> int:
+        """ Apply the records of one journal, return how many
+        """
+        count = 0
+        if not path.exists(journal_path):
+            return count
+        with open(journal_path, 'rb+') as f:
+            offset = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    # torn write of the last record before a crash
+                    if repair:
+                        f.truncate(offset)
+                    break
+                if record.get('op') == 'save':
+                    obj_json = record.get('obj')
+                    objs_json[obj_json.get('id')] = obj_json
+                elif record.get('op') == 'remove':
+                    objs_json.pop(record.get('id'), None)
+                offset += len(line)
+                count += 1
+        return count
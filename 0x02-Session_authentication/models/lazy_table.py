@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+""" Memory-mapped table of a class, for the "lazy" storage mode
+
+A .db_<Class>.lazy file holds:
+  - MAGIC
+  - the objects JSON, one object per line, and unindexed garbage
+    lines of objects saved or removed since
+  - for "id" and each indexed attribute, a section of fixed-width
+    (hash of the value, offset of the line) entries sorted by hash
+  - a JSON meta: {"count", "records_end", "garbage",
+                  "sections": {attr: [offset, n]}}
+  - FOOTER: offset and length of the meta
+Opening a file only reads its footer and meta. Objects are parsed on
+first access and kept, so memory grows with the working set instead
+of the table size.
+"""
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from heapq import merge
+from models.formats import fsync_dir
+from threading import Lock
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+
+MAGIC = b"DBLAZY1\n"
+ENTRY = struct.Struct("<16sQ")
+FOOTER = struct.Struct("<QQ8s")
+COPY_CHUNK = 1 << 24
+
+
+def value_key(value) -> bytes:
+    """ Hash of an attribute value in the index sections
+    """
+    try:
+        encoded = json.dumps(value, sort_keys=True)
+    except TypeError:
+        encoded = repr(value)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+
+
+class MappedFile():
+    """ Read-only view of one .lazy file
+
+    Never changes once opened: a save maps the new file into a new
+    MappedFile, readers holding the old one keep a consistent view
+    until they drop it (the mapping is closed with the last reference)
+    """
+
+    def __init__(self, file_path: str):
+        """ Map a file and read its meta, an absent file is empty
+        """
+        self.file = None
+        self.mm = None
+        self.count = 0
+        self.records_end = len(MAGIC)
+        self.garbage = 0
+        self.sections = {}
+        try:
+            self.file = open(file_path, 'rb')
+            self.mm = mmap.mmap(self.file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            return
+        if self.mm[:len(MAGIC)] != MAGIC or \
+                self.mm[-len(MAGIC):] != MAGIC:
+            raise ValueError("not a lazy table: {}".format(file_path))
+        offset, length, _ = FOOTER.unpack(self.mm[-FOOTER.size:])
+        meta = json.loads(self.mm[offset:offset + length])
+        self.count = meta["count"]
+        self.records_end = meta["records_end"]
+        self.garbage = meta["garbage"]
+        self.sections = meta["sections"]
+
+    def offsets(self, attr: str, key: bytes) -> list:
+        """ Offsets of the lines indexed under a hash
+        """
+        if self.mm is None or attr not in self.sections:
+            return []
+        start, n = self.sections[attr]
+        i = self.bound(attr, key)
+        offsets = []
+        while i < n:
+            entry_key, offset = ENTRY.unpack_from(self.mm,
+                                                  start + i * ENTRY.size)
+            if entry_key != key:
+                break
+            offsets.append(offset)
+            i += 1
+        return offsets
+
+    def bound(self, attr: str, key: bytes, upper: bool = False) -> int:
+        """ Index of the first entry of a section with a hash not
+        lower (upper: greater) than key, by binary search
+        """
+        start, n = self.sections[attr]
+        mm = self.mm
+        low, high = 0, n
+        while low < high:
+            mid = (low + high) // 2
+            at = start + mid * ENTRY.size
+            entry_key = mm[at:at + 16]
+            if entry_key < key or (upper and entry_key == key):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def line(self, offset: int) -> bytes:
+        """ Line starting at an offset, without its newline
+        """
+        return self.mm[offset:self.mm.find(b"\n", offset)]
+
+    def lines(self) -> list:
+        """ Offsets of the live lines, in file order
+        """
+        return sorted(offset for _, offset in self.entries("id"))
+
+    def entries(self, attr: str):
+        """ (hash, offset) entries of a section
+        """
+        if self.mm is None or attr not in self.sections:
+            return iter(())
+        start, n = self.sections[attr]
+        return ENTRY.iter_unpack(self.mm[start:start + n * ENTRY.size])
+
+    def copy(self, f, start: int, end: int):
+        """ Copy a range of the file to f
+
+        copy_file_range copies in the kernel, without faulting the
+        pages into this process; else copy the mapping in chunks
+        """
+        if end <= start:
+            return
+        if hasattr(os, "copy_file_range"):
+            f.flush()
+            try:
+                while start < end:
+                    copied = os.copy_file_range(self.file.fileno(),
+                                                f.fileno(),
+                                                end - start, start)
+                    if copied == 0:
+                        break
+                    start += copied
+            except OSError:
+                pass
+            # resync the buffered position with the descriptor's
+            f.seek(0, os.SEEK_END)
+        for offset in range(start, end, COPY_CHUNK):
+            f.write(self.mm[offset:min(offset + COPY_CHUNK, end)])
+
+
+class LazyTable(MutableMapping):
+    """ {id: object} mapping of a class backed by a .lazy file
+
+    Objects saved or removed since the file was mapped are tracked in
+    memory until save() writes a new file. Readers work on the
+    MappedFile they started with and only take the short hydration
+    lock to publish a newly parsed object. Writers (__setitem__,
+    __delitem__, save) must be serialized by the caller.
+    """
+
+    def __init__(self, cls, file_path: str):
+        """ Open (without reading) the file of a class
+        """
+        self.cls = cls
+        self.file_path = file_path
+        self.attributes = ("id",) + tuple(cls.INDEXED_ATTRIBUTES)
+        self.hydrated = {}
+        self.dirty = set()
+        self.deleted = set()
+        self.added = set()
+        self.mapped = MappedFile(file_path)
+        self._hydration = Lock()
+
+    @classmethod
+    def create(cls, model, file_path: str, objs_json: dict):
+        """ Write the file of a class from its objects JSON,
+        e.g. to migrate from another storage format; the file must
+        not exist yet, writing appends
+        """
+        if os.path.exists(file_path):
+            raise FileExistsError(file_path)
+        table = cls(model, file_path)
+        table._write(objs_json.values())
+        return table
+
+    def lookup(self, attr: str, value) -> dict:
+        """ Objects of the file whose attribute had this value when
+        written, hydrated; callers re-check the current value
+        """
+        mapped = self.mapped
+        objs = {}
+        for offset in mapped.offsets(attr, value_key(value)):
+            obj = self._hydrate(mapped, offset)
+            if obj is not None:
+                objs[obj.id] = obj
+        return objs
+
+    def _offset(self, obj_id: str, mapped: MappedFile = None):
+        """ Offset of the line of an ID in the file, or None
+        """
+        mapped = mapped or self.mapped
+        offsets = mapped.offsets("id", value_key(obj_id))
+        return offsets[0] if offsets else None
+
+    def _hydrate(self, mapped: MappedFile, offset: int):
+        """ Object of the line at an offset, None if removed since
+        """
+        obj_json = json.loads(mapped.line(offset))
+        obj_id = obj_json["id"]
+        if obj_id in self.deleted:
+            return None
+        obj = self.hydrated.get(obj_id)
+        if obj is not None:
+            return obj
+        obj = self.cls(**obj_json)
+        with self._hydration:
+            # a writer may have saved, removed or rewritten the object
+            # while it was parsed from this (maybe old) file
+            current = self.hydrated.get(obj_id)
+            if current is not None:
+                return current
+            if obj_id in self.deleted:
+                return None
+            if mapped is not self.mapped and self._offset(obj_id) is None:
+                return None
+            self.hydrated[obj_id] = obj
+        return obj
+
+    def __getitem__(self, obj_id: str):
+        if obj_id in self.deleted:
+            raise KeyError(obj_id)
+        obj = self.hydrated.get(obj_id)
+        if obj is not None:
+            return obj
+        mapped = self.mapped
+        offset = self._offset(obj_id, mapped)
+        if offset is None:
+            raise KeyError(obj_id)
+        obj = self._hydrate(mapped, offset)
+        if obj is None:
+            raise KeyError(obj_id)
+        return obj
+
+    def __contains__(self, obj_id) -> bool:
+        if obj_id in self.deleted:
+            return False
+        return obj_id in self.hydrated or self._offset(obj_id) is not None
+
+    def __setitem__(self, obj_id: str, obj):
+        with self._hydration:
+            if obj_id not in self.hydrated and obj_id not in self.deleted \
+                    and self._offset(obj_id) is None:
+                self.added.add(obj_id)
+            self.hydrated[obj_id] = obj
+            self.dirty.add(obj_id)
+            self.deleted.discard(obj_id)
+
+    def __delitem__(self, obj_id: str):
+        if obj_id not in self:
+            raise KeyError(obj_id)
+        with self._hydration:
+            if obj_id in self.added:
+                self.added.discard(obj_id)
+            else:
+                self.deleted.add(obj_id)
+            self.hydrated.pop(obj_id, None)
+            self.dirty.discard(obj_id)
+
+    def __len__(self) -> int:
+        return self.mapped.count - len(self.deleted) + len(self.added)
+
+    def __iter__(self):
+        mapped = self.mapped
+        for offset in mapped.lines():
+            obj_id = json.loads(mapped.line(offset))["id"]
+            if obj_id not in self.deleted:
+                yield obj_id
+        yield from tuple(self.added)
+
+    def items(self):
+        """ (id, object) of every object, hydrating all of them
+        """
+        mapped = self.mapped
+        for offset in mapped.lines():
+            obj = self._hydrate(mapped, offset)
+            if obj is not None:
+                yield obj.id, obj
+        for obj_id in tuple(self.added):
+            obj = self.hydrated.get(obj_id)
+            if obj is not None:
+                yield obj_id, obj
+
+    def values(self):
+        """ Every object, hydrating all of them
+        """
+        for _, obj in self.items():
+            yield obj
+
+    def save(self):
+        """ Write a new file: the unchanged lines are copied as is,
+        the objects saved since the file was mapped are appended
+        """
+        self._write(self.hydrated[obj_id].to_json(True)
+                    for obj_id in tuple(self.dirty)
+                    if obj_id in self.hydrated)
+
+    def _write(self, objs_json):
+        """ Write the file atomically
+
+        The lines of the objects saved or removed since the file was
+        mapped stay in place as garbage, unindexed; new lines are
+        appended and the sections patched with slices of the current
+        ones, so a save copies the file but never walks it in Python.
+        Once garbage outweighs the live lines, they are compacted.
+        """
+        mapped = self.mapped
+        dead = sorted(offset for offset in map(self._offset,
+                                               self.dirty | self.deleted)
+                      if offset is not None)
+        removed = {attr: [] for attr in self.attributes}
+        garbage = mapped.garbage
+        for offset in dead:
+            line = mapped.line(offset)
+            old_json = json.loads(line)
+            for attr in self.attributes:
+                if attr in old_json:
+                    removed[attr].append((value_key(old_json[attr]), offset))
+            garbage += len(line) + 1
+        compact = garbage > mapped.records_end - len(MAGIC) - garbage
+
+        tmp_path = "{}.tmp".format(self.file_path)
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            if compact:
+                moved = self._write_compacted(f, set(dead))
+                garbage = 0
+            else:
+                mapped.copy(f, len(MAGIC), mapped.records_end)
+            position = f.tell()
+            count = mapped.count - len(dead)
+
+            added = {attr: [] for attr in self.attributes}
+            for obj_json in objs_json:
+                for attr in self.attributes:
+                    if attr in obj_json:
+                        added[attr].append((value_key(obj_json[attr]),
+                                            position))
+                line = json.dumps(obj_json).encode() + b"\n"
+                f.write(line)
+                position += len(line)
+                count += 1
+            records_end = position
+
+            sections = {}
+            for attr in self.attributes:
+                added[attr].sort()
+                if compact:
+                    n = 0
+                    for entry in merge(self._moved(attr, moved),
+                                       added[attr]):
+                        f.write(ENTRY.pack(*entry))
+                        n += 1
+                else:
+                    n = self._patch(f, attr, removed[attr], added[attr])
+                sections[attr] = [position, n]
+                position += n * ENTRY.size
+
+            meta = json.dumps({"count": count, "records_end": records_end,
+                               "garbage": garbage,
+                               "sections": sections}).encode()
+            f.write(meta)
+            f.write(FOOTER.pack(position, len(meta), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+        fsync_dir(self.file_path)
+
+        mapped = MappedFile(self.file_path)
+        with self._hydration:
+            self.mapped = mapped
+            self.added = set()
+            self.deleted = set()
+            self.dirty = set()
+
+    def _patch(self, f, attr: str, removed: list, added: list) -> int:
+        """ Write a section: the current one without the removed
+        entries, with the added ones; returns the number of entries
+        """
+        mapped = self.mapped
+        if mapped.mm is None or attr not in mapped.sections:
+            for entry in added:
+                f.write(ENTRY.pack(*entry))
+            return len(added)
+        start, n = mapped.sections[attr]
+        events = []
+        for key, offset in removed:
+            i = mapped.bound(attr, key)
+            while i < n:
+                entry = ENTRY.unpack_from(mapped.mm, start + i * ENTRY.size)
+                if entry == (key, offset):
+                    events.append((i, 1, entry))
+                    break
+                if entry[0] != key:
+                    break
+                i += 1
+        for entry in added:
+            events.append((mapped.bound(attr, entry[0], True), 0, entry))
+        events.sort()
+
+        cursor = 0
+        for i, kind, entry in events:
+            mapped.copy(f, start + cursor * ENTRY.size,
+                        start + i * ENTRY.size)
+            if kind == 0:
+                f.write(ENTRY.pack(*entry))
+                cursor = i
+            else:
+                cursor = i + 1
+        mapped.copy(f, start + cursor * ENTRY.size, start + n * ENTRY.size)
+        return n + len(added) - sum(kind for _, kind, _ in events)
+
+    def _write_compacted(self, f, dead: set) -> tuple:
+        """ Write the live lines without the garbage; returns their
+        (old offsets, new offsets), both sorted
+        """
+        mapped = self.mapped
+        old, new = [], []
+        position = len(MAGIC)
+        for offset in mapped.lines():
+            if offset in dead:
+                continue
+            line = mapped.line(offset) + b"\n"
+            f.write(line)
+            old.append(offset)
+            new.append(position)
+            position += len(line)
+        return old, new
+
+    def _moved(self, attr: str, moved: tuple):
+        """ Entries of a section for the lines kept by a compaction,
+        with their new offsets
+        """
+        old, new = moved
+        for key, offset in self.mapped.entries(attr):
+            i = bisect_left(old, offset)
+            if i < len(old) and old[i] == offset:
+                yield key, new[i]
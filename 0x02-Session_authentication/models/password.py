@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" Password hashing module
+
+Stored hashes are versioned by their format:
+  - "sha256": legacy unsalted SHA256 hex digest (64 hex characters)
+  - "bcrypt": "$2b$<cost>$..." modular crypt string
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import getenv, urandom
+from threading import Lock
+import bcrypt
+import hashlib
+import hmac
+
+
+PASSWORD_HASH_ROUNDS = int(getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_VERIFY_WORKERS = int(getenv("PASSWORD_VERIFY_WORKERS", "4"))
+PASSWORD_VERIFY_CACHE_SIZE = int(getenv("PASSWORD_VERIFY_CACHE_SIZE", "1024"))
+
+_verifier = ThreadPoolExecutor(max_workers=PASSWORD_VERIFY_WORKERS,
+                               thread_name_prefix="password-verify")
+_verified = OrderedDict()
+_verified_lock = Lock()
+_verified_key = urandom(32)
+
+
+def scheme(hashed: str) -> str:
+    """ Name of the format of a stored hash, None if unknown
+    """
+    if hashed is None:
+        return None
+    if hashed.startswith("$2"):
+        return "bcrypt"
+    if len(hashed) == 64:
+        return "sha256"
+    return None
+
+
+def hash_password(pwd: str) -> str:
+    """ Hash a password with bcrypt at PASSWORD_HASH_ROUNDS
+    """
+    salt = bcrypt.gensalt(PASSWORD_HASH_ROUNDS)
+    return bcrypt.hashpw(pwd.encode(), salt).decode()
+
+
+def needs_rehash(hashed: str) -> bool:
+    """ True if a stored hash is not bcrypt at the current cost
+    """
+    if scheme(hashed) != "bcrypt":
+        return True
+    return hashed.split("$")[2] != "{:02d}".format(PASSWORD_HASH_ROUNDS)
+
+
+def verify_async(hashed: str, pwd: str) -> Future:
+    """ Check a password against a stored hash on the verifier pool
+
+    Successful bcrypt checks are remembered, keyed by the stored hash
+    and a keyed digest of the password, so repeated logins (e.g. Basic
+    auth on every request) cost one HMAC instead of one bcrypt run.
+    """
+    future = Future()
+    kind = scheme(hashed)
+    if kind == "sha256":
+        digest = hashlib.sha256(pwd.encode()).hexdigest().lower()
+        future.set_result(hmac.compare_digest(digest, hashed))
+        return future
+    if kind != "bcrypt":
+        future.set_result(False)
+        return future
+
+    key = (hashed, hmac.new(_verified_key, pwd.encode(),
+                            hashlib.sha256).digest())
+    with _verified_lock:
+        if key in _verified:
+            _verified.move_to_end(key)
+            future.set_result(True)
+            return future
+
+    def _check() -> bool:
+        if not bcrypt.checkpw(pwd.encode(), hashed.encode()):
+            return False
+        with _verified_lock:
+            _verified[key] = True
+            while len(_verified) > PASSWORD_VERIFY_CACHE_SIZE:
+                _verified.popitem(last=False)
+        return True
+
+    return _verifier.submit(_check)
+
+
+def verify(hashed: str, pwd: str) -> bool:
+    """ Check a password against a stored hash
+    """
+    return verify_async(hashed, pwd).result()
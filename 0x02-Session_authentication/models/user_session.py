@@ -5,6 +5,10 @@ from models.base import Base
 class UserSession(Base):
     """Class representing a user session"""
 
+    __slots__ = ('user_id', 'session_id')
+
+    INDEXED_ATTRIBUTES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a UserSession instance"""
         super().__init__(*args, **kwargs)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+""" Stress test of the model storage: threads create, search, log in
+and remove users at the same time, then the files are reloaded and
+compared with what the threads did
+
+Each storage mode runs in its own process and temporary directory, the
+.db files of the project are not touched.
+
+Usage:
+    python3 stress_storage.py [file|journal|lazy ...]
+"""
+from os import environ, path
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+
+THREADS = 16
+USERS_PER_THREAD = 60
+
+
+class Request():
+    """ Request with a session cookie, for destroy_session """
+
+    def __init__(self, session_id: str):
+        """ Initialize a Request """
+        self.cookies = {environ["SESSION_NAME"]: session_id}
+
+
+def stress():
+    """ Runs the workload in the current directory and storage mode """
+    from api.v1.auth.session_db_auth import SessionDBAuth
+    from models import base
+    from models.user import User
+    from models.user_session import UserSession
+
+    User.load_from_file()
+    UserSession.load_from_file()
+    auth = SessionDBAuth()
+    errors = []
+    created = {}
+    removed = set()
+    lock = threading.Lock()
+
+    def worker(n: int):
+        rand = random.Random(n)
+        try:
+            for i in range(USERS_PER_THREAD):
+                user = User()
+                user.email = "u{}_{}@example.com".format(n, i)
+                user.password = "pw"
+                user.save()
+                with lock:
+                    created[user.id] = user.email
+                found = User.search({"email": user.email})
+                assert len(found) == 1 and found[0] is user, found
+                assert found[0].is_valid_password("pw")
+                session_id = auth.create_session(user.id)
+                assert auth.user_id_for_session_id(session_id) == user.id
+                User.count()
+                User.search()
+                User.page(limit=5)
+                if rand.random() < 0.3:
+                    assert auth.destroy_session(Request(session_id))
+                    user.remove()
+                    with lock:
+                        removed.add(user.id)
+                    assert User.get(user.id) is None
+        except Exception:
+            errors.append(traceback.format_exc())
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,))
+               for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(errors[0])
+        sys.exit(1)
+
+    live = {obj_id: email for obj_id, email in created.items()
+            if obj_id not in removed}
+    assert {u.id: u.email for u in User.all()} == live
+    for flusher in base.FLUSHERS.values():
+        flusher.close()
+    User.load_from_file()
+    UserSession.load_from_file()
+    assert {u.id: u.email for u in User.all()} == live, \
+        (User.count(), len(live))
+    assert UserSession.count() == len(live), \
+        (UserSession.count(), len(live))
+    print("{}: ok, {} threads in {:.1f}s, {} users left".format(
+        base.STORAGE_MODE, THREADS, elapsed, len(live)))
+
+
+if __name__ == "__main__":
+    if environ.get("STRESS_STORAGE_CHILD") == "1":
+        stress()
+        sys.exit(0)
+
+    project = path.dirname(path.abspath(__file__))
+    failed = False
+    for mode in sys.argv[1:] or ["file", "journal", "lazy"]:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(environ, STORAGE_MODE=mode, STRESS_STORAGE_CHILD="1",
+                       SESSION_NAME="_my_session_id",
+                       PASSWORD_HASH_ROUNDS=environ.get(
+                           "PASSWORD_HASH_ROUNDS", "4"),
+                       PYTHONPATH=project)
+            failed |= subprocess.run([sys.executable,
+                                      path.abspath(__file__)],
+                                     cwd=directory, env=env).returncode != 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Tests of the write-behind Flusher
+
+Usage:
+    python3 -m unittest test_flusher
+"""
+import threading
+import time
+import unittest
+from models.flusher import Flusher
+
+
+class TestFlusher(unittest.TestCase):
+    """ Flusher with a write counting its calls """
+
+    def setUp(self):
+        """ A flusher whose next write may be made to fail """
+        self.calls = 0
+        self.fail_next = False
+        self.failed = threading.Event()
+
+        def write():
+            self.calls += 1
+            if self.fail_next:
+                self.fail_next = False
+                self.failed.set()
+                raise OSError("disk full")
+
+        self.flusher = Flusher(write, interval=0.01, batch=100)
+
+    def wait_written(self, generation: int):
+        """ Waits for a generation, past the errors of failed writes """
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                return self.flusher.wait(generation)
+            except OSError:
+                time.sleep(0.01)
+        self.fail("generation {} never written".format(generation))
+
+    def test_marks_are_written(self):
+        """ Marks are covered by a write """
+        for generation in range(1, 11):
+            self.flusher.mark(generation)
+        self.flusher.wait(10)
+        self.assertGreaterEqual(self.calls, 1)
+        self.assertEqual(self.flusher.writes, self.calls)
+
+    def test_write_retried_after_failure(self):
+        """ A failed write is retried without a new mark, and the
+        flusher keeps writing afterwards """
+        self.fail_next = True
+        self.flusher.mark(1)
+        self.assertTrue(self.failed.wait(5))
+        self.wait_written(1)
+        self.assertEqual(self.calls, 2)
+
+        self.flusher.mark(2)
+        self.flusher.wait(2)
+        self.assertEqual(self.calls, 3)
+        self.assertTrue(self.flusher._thread.is_alive())
+
+    def test_wait_raises_error_of_failed_write(self):
+        """ A waiter sees the error of the write that should have
+        covered its mark """
+        self.flusher.interval = 0.5
+        self.fail_next = True
+        self.flusher.mark(1)
+        with self.assertRaises(OSError):
+            self.flusher.wait(1)
+        self.wait_written(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+""" Tests of the on-disk formats
+
+Usage:
+    python3 -m unittest test_formats
+"""
+import io
+import os
+import random
+import tempfile
+import unittest
+from models.formats import FORMATS, read, write_atomic
+
+
+def round_trip(storage_format, objs_json: dict) -> dict:
+    """ Dumps objects in a format and loads them back """
+    f = io.BytesIO() if storage_format.binary else io.StringIO()
+    storage_format.dump(objs_json, f)
+    f.seek(0)
+    return storage_format.load(f)
+
+
+class TestFormats(unittest.TestCase):
+    """ Round trips through every format """
+
+    OBJS_JSON = {
+        "a": {"id": "a", "email": "a@hbtn.io", "first_name": None,
+              "age": 3},
+        "b": {"id": "b", "email": "é\x00z", "flag": True,
+              "tags": [1, {"x": None}]},
+        # lone surrogates are valid JSON, e.g. posted to /api/v1/users
+        "c": {"id": "c", "email": "", "first_name": "\ud800",
+              "last_name": "x\udfff€"},
+        "\udc80": {"id": "\udc80", "\ud801": "k"},
+    }
+
+    def test_round_trip(self):
+        """ Every format loads back what it dumped """
+        for storage_format in FORMATS.values():
+            with self.subTest(storage_format.name):
+                self.assertEqual(round_trip(storage_format, {}), {})
+                self.assertEqual(round_trip(storage_format, self.OBJS_JSON),
+                                 self.OBJS_JSON)
+
+    def test_random_round_trip(self):
+        """ Random tables with missing attributes and mixed values """
+        rand = random.Random(0)
+        choices = [None, "", "ab", "\x00", "ü€", "\ud800", 1,
+                   2.5, False, [1], {"a": "b"}]
+        for _ in range(500):
+            objs_json = {}
+            for i in range(rand.randint(0, 5)):
+                obj_json = {"id": str(i)}
+                for key in "pqrs":
+                    if rand.random() < 0.7:
+                        obj_json[key] = rand.choice(choices)
+                objs_json[str(i)] = obj_json
+            for storage_format in FORMATS.values():
+                self.assertEqual(round_trip(storage_format, objs_json),
+                                 objs_json)
+
+    def test_columnar_corrupt_file(self):
+        """ A corrupt columnar file raises ValueError """
+        columnar = FORMATS["columnar"]
+        f = io.BytesIO()
+        columnar.dump(self.OBJS_JSON, f)
+        data = f.getvalue()
+        rand = random.Random(0)
+        for _ in range(2000):
+            corrupt = bytearray(data)
+            if rand.random() < 0.5:
+                corrupt = corrupt[:rand.randrange(len(corrupt))]
+            else:
+                for _ in range(rand.randint(1, 4)):
+                    corrupt[rand.randrange(len(corrupt))] = \
+                        rand.randrange(256)
+            try:
+                columnar.load(io.BytesIO(bytes(corrupt)))
+            except ValueError:
+                pass
+
+    def test_write_atomic(self):
+        """ A failed write keeps the previous file, without a .tmp """
+        for storage_format in FORMATS.values():
+            with self.subTest(storage_format.name), \
+                    tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, ".db_Test")
+                write_atomic(path, self.OBJS_JSON, storage_format)
+                with self.assertRaises(TypeError):
+                    write_atomic(path, {"d": {"id": "d", "v": {1}}},
+                                 storage_format)
+                self.assertEqual(os.listdir(directory), [".db_Test"])
+                self.assertEqual(read(path, storage_format),
+                                 self.OBJS_JSON)
+
+
+if __name__ == "__main__":
+    unittest.main()